@@ -0,0 +1,117 @@
+import re
+import json
+import logging
+
+# Configure basic logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Materials every automataScripting series starts from (see data_generation.py).
+DEFAULT_BASE_MATERIALS = ("sand", "water", "gas")
+# Key under which pruned materials are listed by name only.
+OTHER_MATERIALS_KEY = "other_materials"
+
+# Action fields whose values name material types.
+_MATERIAL_LIST_FIELDS = ("options", "into_options")
+_MATERIAL_NAME_FIELDS = ("to", "set_type")
+
+
+def collect_material_references(behavior):
+    """
+    Collects every material type named inside a behaviour tree.
+
+    Walks nested actions and gathers the names in `options` / `into_options`
+    lists and in string-valued `to` / `set_type` fields (numeric `to` values,
+    as used by do_set_alpha, are ignored).
+
+    Args:
+        behavior (dict | list): A material's behaviour, e.g. {"actions": [...]}.
+
+    Returns:
+        set: The referenced material names.
+    """
+    references = set()
+    stack = [behavior]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+        elif isinstance(node, dict):
+            for key, value in node.items():
+                if key in _MATERIAL_LIST_FIELDS and isinstance(value, list):
+                    references.update(v for v in value if isinstance(v, str))
+                elif key in _MATERIAL_NAME_FIELDS and isinstance(value, str):
+                    references.add(value)
+                elif isinstance(value, (dict, list)):
+                    stack.append(value)
+    return references
+
+
+def find_named_materials(task_input, material_names):
+    """
+    Returns the materials whose names appear as whole words in the task input.
+    Underscores in a material name also match spaces (e.g. 'dry_grass' / 'dry grass').
+    """
+    text = str(task_input).lower()
+    named = set()
+    for name in material_names:
+        pattern = r"\b" + re.escape(name.lower()).replace("_", "[_ ]") + r"\b"
+        if re.search(pattern, text):
+            named.add(name)
+    return named
+
+
+def prune_automata_context(context, task_input, base_materials=DEFAULT_BASE_MATERIALS):
+    """
+    Reduces an automataScripting context to the materials relevant to one task.
+
+    Kept in full: the base materials, materials named in the task input, and every
+    material reachable from those through references in their behaviour trees.
+    All other materials are collapsed into a name-only list under
+    OTHER_MATERIALS_KEY, so the model still knows they exist. Prompt size then
+    stays roughly flat as a series grows, instead of growing with every material.
+
+    Args:
+        context (dict): material name -> behaviour, as built by
+            generate_automata_scripting_tasks.
+        task_input (str): The task's behaviour description.
+        base_materials (iterable): Materials that are always kept.
+
+    Returns:
+        dict: The pruned context. The input context is not modified.
+    """
+    materials = {name: behavior for name, behavior in context.items() if name != OTHER_MATERIALS_KEY}
+    keep = {name for name in base_materials if name in materials}
+    keep |= find_named_materials(task_input, materials)
+
+    # Follow references transitively, e.g. seed -> stem -> flower.
+    frontier = list(keep)
+    while frontier:
+        for reference in collect_material_references(materials[frontier.pop()]):
+            if reference in materials and reference not in keep:
+                keep.add(reference)
+                frontier.append(reference)
+
+    pruned = {name: behavior for name, behavior in materials.items() if name in keep}
+    others = [name for name in materials if name not in keep]
+    others.extend(context.get(OTHER_MATERIALS_KEY, []))
+    if others:
+        pruned[OTHER_MATERIALS_KEY] = others
+    return pruned
+
+
+if __name__ == '__main__':
+    # Demo: a plant series where only the stem and its references matter.
+    demo_context = {
+        "sand": {"actions": [{"type": "if_neighbor_is", "options": ["air", "water"], "actions": []}]},
+        "water": {"actions": []},
+        "gas": {"actions": []},
+        "seed": {"actions": [{"type": "do_set_type", "target": "self", "to": "stem"}]},
+        "stem": {"actions": [{"type": "do_spawn", "direction": "north", "into_options": ["air"], "set_type": "bud"}]},
+        "bud": {"actions": [{"type": "do_set_alpha", "target": "self", "operation": "add", "to": 10}]},
+        "petal": {"actions": [{"type": "do_set_type", "target": "self", "to": "dirt"}]},
+        "dirt": {"actions": []},
+    }
+    demo_input = "A seed that sprouts into a stem when it touches water."
+    pruned_context = prune_automata_context(demo_context, demo_input)
+    logging.info(f"Full context: {len(json.dumps(demo_context))} characters, pruned: {len(json.dumps(pruned_context))} characters.")
+    print(json.dumps(pruned_context, indent=2))
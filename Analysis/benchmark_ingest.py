@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+from datetime import datetime
+
+from db_utils import create_connection, create_db_tables
+from ingest_data import ingest_log_files, iter_session_files, iter_log_sections, build_response_row, insert_response_rows
+
+SECTIONS_PER_FILE = 1000
+FILES_PER_GROUP = 20
+
+
+def write_synthetic_logs(master_folder, num_sections, context_materials=8, seed=0):
+    """
+    Writes num_sections synthetic log sections as master_folder/group/session.txt
+    files, shaped like prompting.py output (input, JSON context, response, telemetry).
+
+    Returns:
+        int: Total bytes written.
+    """
+    rng = random.Random(seed)
+    context = {f"material_{i}": {"actions": [{"type": "if_neighbor_is", "options": ["air", "water"],
+                                              "actions": [{"type": "do_swap", "direction": "south"}]}]}
+               for i in range(context_materials)}
+    context_str = json.dumps(context)
+    total_bytes = 0
+    written = 0
+    file_index = 0
+    while written < num_sections:
+        group_dir = os.path.join(master_folder, f"group_{file_index // FILES_PER_GROUP:04d}")
+        os.makedirs(group_dir, exist_ok=True)
+        count = min(SECTIONS_PER_FILE, num_sections - written)
+        entries = []
+        for i in range(count):
+            task_index = written + i
+            response = json.dumps({"name": "mat", "color_hex": "#A0B0C0",
+                                   "behavior": {"actions": [{"type": "do_swap", "direction": rng.choice(["south", "east"])}]}})
+            telemetry = json.dumps({"latency_s": round(rng.uniform(0.5, 5.0), 3), "input_tokens": 900, "output_tokens": 120})
+            entries.append(f"[automataScripting-2025-06-15-09-30-01-{task_index:07d}]\n"
+                           f"input::Synthetic material {task_index} that falls and dissolves in water.\n"
+                           f"context::{context_str}\n"
+                           f"response::{response}\n"
+                           f"telemetry::{telemetry}\n"
+                           f"---END_SECTION---\n\n")
+        data = "".join(entries).encode('utf-8')
+        with open(os.path.join(group_dir, f"Session-{file_index:05d}.txt"), 'wb') as f:
+            f.write(data)
+        total_bytes += len(data)
+        written += count
+        file_index += 1
+    return total_bytes
+
+
+def ingest_row_at_a_time(db_file, master_folder):
+    """
+    The previous insertion strategy, for comparison: one execute() and timestamp per
+    row, a single transaction and SQLite's default pragmas (parsing is shared with 'bulk').
+    """
+    conn = create_connection(db_file, profile=None)
+    create_db_tables(conn)
+    for group_name, session_name, file_path in iter_session_files(master_folder):
+        for _, _, task_data in iter_log_sections(file_path):
+            row = build_response_row(group_name, session_name, task_data, datetime.now().isoformat())
+            insert_response_rows(conn, [row])
+    conn.commit()
+    conn.close()
+
+
+def run_ingest_benchmark(sizes=(10000, 100000, 1000000), include_row_at_a_time=False, workers=None, work_dir=None):
+    """
+    Measures ingestion throughput (rows per second) for each log size in `sizes`.
+    With workers > 1 the parallel ingestion path is timed as well.
+
+    Returns:
+        dict: size -> {mode: rows per second}
+    """
+    own_work_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="latentspace-ingest-bench-")
+    results = {}
+    try:
+        for size in sizes:
+            master_folder = os.path.join(work_dir, f"logs_{size}")
+            total_bytes = write_synthetic_logs(master_folder, size)
+            print(f"\nGenerated {size} sections ({total_bytes / 1e6:.1f} MB) in '{master_folder}'.")
+            modes = {'bulk': lambda db: ingest_log_files(db, master_folder)}
+            if workers and workers > 1:
+                modes[f'parallel_x{workers}'] = lambda db: ingest_log_files(db, master_folder, workers=workers)
+            if include_row_at_a_time:
+                modes['row_at_a_time'] = lambda db: ingest_row_at_a_time(db, master_folder)
+            results[size] = {}
+            for mode, ingest in modes.items():
+                db_file = os.path.join(work_dir, f"bench_{size}_{mode}.db")
+                start = time.perf_counter()
+                ingest(db_file)
+                seconds = time.perf_counter() - start
+                results[size][mode] = size / seconds
+                print(f"  {mode:<14} {seconds:8.2f}s  {size / seconds:10.0f} rows/s")
+                os.remove(db_file)
+            shutil.rmtree(master_folder, ignore_errors=True)
+    finally:
+        if own_work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print("\n--- Ingestion Benchmark ---")
+    for size, modes in results.items():
+        print(f"  {size:>8} sections: " + ", ".join(f"{mode} {rate:.0f} rows/s" for mode, rate in modes.items()))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark session log ingestion throughput.")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Comma-separated numbers of log sections to ingest (1M sections is ~1.5 GB of logs).")
+    parser.add_argument("--row_at_a_time", action="store_true", help="Also time the old row-at-a-time path (slow at large sizes).")
+    parser.add_argument("--workers", type=int, default=None, help="Also time parallel ingestion with this many parser processes.")
+    parser.add_argument("--work_dir", default=None, help="Directory for the synthetic logs and databases (default: a temp dir).")
+    args = parser.parse_args()
+
+    run_ingest_benchmark(
+        sizes=[int(size) for size in args.sizes.split(",")],
+        include_row_at_a_time=args.row_at_a_time,
+        workers=args.workers,
+        work_dir=args.work_dir
+    )
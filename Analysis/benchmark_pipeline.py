@@ -0,0 +1,116 @@
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+from db_utils import create_connection, create_db_tables
+from providers import MockProvider, ReplayProvider, register_provider
+from data_generation import generate_spell_tasks
+from prompting import run_prompting_session
+from ingest_data import ingest_log_files
+from run_judging import process_unjudged_instances
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PREAMBLE_FILE = os.path.join(SCRIPT_DIR, "game_prompts", "spellScriptingOneShot.txt")
+JUDGE_PROMPT_DIR = os.path.join(SCRIPT_DIR, "judge_prompts")
+
+
+def run_offline_benchmark(num_tasks=100, concurrency=16, latency=0.2, latency_jitter=0.1,
+                          error_rate=0.0, throttle_rate=0.0, replay_logs=None, seed=0, work_dir=None):
+    """
+    Runs the full pipeline (generate -> prompt -> ingest -> judge) against offline
+    providers and reports the wall-clock time of each stage.
+
+    Every stage uses 'mock:' models, so no API keys or network access are needed.
+    With replay_logs, the prompting stage serves recorded responses from those
+    session logs instead of canned ones.
+
+    Returns:
+        dict: Seconds spent in each stage.
+    """
+    random.seed(seed)
+    register_provider(MockProvider(latency=latency, latency_jitter=latency_jitter, error_rate=error_rate,
+                                   throttle_rate=throttle_rate, seed=seed))
+    model_name = "mock:benchmark"
+    if replay_logs:
+        register_provider(ReplayProvider.from_session_logs(replay_logs, latency=latency))
+        model_name = "replay:benchmark"
+
+    own_work_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="latentspace-bench-")
+    task_file = os.path.join(work_dir, "spellScripting_tasks.json")
+    log_dir = os.path.join(work_dir, "session_logs")
+    db_file = os.path.join(work_dir, "benchmark.db")
+
+    with open(PREAMBLE_FILE, 'r') as f:
+        preamble = f.read()
+
+    timings = {}
+    try:
+        start = time.perf_counter()
+        generate_spell_tasks(num_tasks=num_tasks, output_file=task_file, model_name="mock:generator")
+        timings['generate'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        run_prompting_session("spellScripting", model_name, preamble, task_file, log_dir, concurrency=concurrency)
+        timings['prompt'] = time.perf_counter() - start
+
+        # Mirror the notebook's reorganisation step: group_name/Session-*.txt
+        group_dir = os.path.join(log_dir, "benchmark_group")
+        os.makedirs(group_dir, exist_ok=True)
+        for filename in os.listdir(log_dir):
+            if filename.startswith("LatentSpaceLog-") and filename.endswith(".txt"):
+                shutil.move(os.path.join(log_dir, filename), os.path.join(group_dir, "Session-benchmark.txt"))
+
+        conn = create_connection(db_file)
+        create_db_tables(conn)
+        conn.close()
+
+        start = time.perf_counter()
+        ingest_log_files(db_file, log_dir)
+        timings['ingest'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        process_unjudged_instances(db_file, JUDGE_PROMPT_DIR, limit=num_tasks, judge_model_name="mock:judge",
+                                   concurrency=concurrency)
+        timings['judge'] = time.perf_counter() - start
+    finally:
+        if own_work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print("\n--- Offline Pipeline Benchmark ---")
+    print(f"  Tasks: {num_tasks}, Concurrency: {concurrency}, Mock latency: {latency}s +/- {latency_jitter}s")
+    for stage, seconds in timings.items():
+        print(f"  {stage:<10} {seconds:8.2f}s  ({num_tasks / seconds if seconds else float('inf'):.1f} tasks/s)")
+    print(f"  {'total':<10} {sum(timings.values()):8.2f}s")
+    return timings
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the full pipeline offline with mock/replay providers.")
+    parser.add_argument("--num_tasks", type=int, default=100, help="Number of synthetic tasks to run through the pipeline.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Prompting and judging concurrency limit.")
+    parser.add_argument("--latency", type=float, default=0.2, help="Mean simulated API latency in seconds.")
+    parser.add_argument("--latency_jitter", type=float, default=0.1, help="Uniform jitter around the mean latency, in seconds.")
+    parser.add_argument("--error_rate", type=float, default=0.0, help="Probability of a simulated retryable server error.")
+    parser.add_argument("--throttle_rate", type=float, default=0.0, help="Probability of a simulated 429 rate-limit error.")
+    parser.add_argument("--replay_logs", default=None, help="Serve prompting responses recorded in this session_logs folder.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for task generation and simulated behaviour.")
+    args = parser.parse_args()
+
+    if args.num_tasks < 1:
+        sys.exit("num_tasks must be at least 1.")
+
+    run_offline_benchmark(
+        num_tasks=args.num_tasks,
+        concurrency=args.concurrency,
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        replay_logs=args.replay_logs,
+        seed=args.seed
+    )
@@ -1,31 +1,42 @@
-import os
 import sys
 import json
 import random
 import copy
-import google.generativeai as genai
 
-def generate_spell_tasks(num_tasks=10, output_file="spell_scripting_tasks.json"):
+from providers import get_provider, ProviderConfigError
+from automata_context import prune_automata_context
+
+# The model used to generate synthetic task descriptions. Any registered provider
+# works, e.g. 'mock:generator' to generate tasks offline.
+GENERATION_MODEL_NAME = 'gemini-2.5-flash-preview-05-20'
+
+def _get_generation_provider(model_name):
+    """Resolves the generation model's provider, exiting if it is not configured."""
+    try:
+        provider, provider_model = get_provider(model_name)
+        provider.setup()
+    except ProviderConfigError as e:
+        print(f"\nERROR: Could not configure the generation model '{model_name}': {e}")
+        sys.exit(1)
+    return provider, provider_model
+
+def generate_spell_tasks(num_tasks=10, output_file="spell_scripting_tasks.json", model_name=GENERATION_MODEL_NAME):
     """
     Generates synthetic tasks for a "spellScripting" model.
 
-    This function prompts a Gemini model to create magical spell descriptions,
+    This function prompts a model (Gemini by default) to create magical spell descriptions,
     then pairs each description with a random list of "available elements"
     to form an (input, context) pair for a future task.
 
     Args:
         num_tasks (int): The number of synthetic tasks to generate.
         output_file (str): The name of the JSON file to save the tasks to.
+        model_name (str): The model used to write the spell descriptions.
     """
     print("--- Starting Synthetic Spell Task Generation ---")
 
-    # 1. Load the Gemini API key from the environment variable
-    api_key = os.getenv("GEMINI_API_KEY")
-    if api_key is None:
-        print("\nERROR: The GEMINI_API_KEY environment variable is not set.")
-        sys.exit(1)
-    
-    genai.configure(api_key=api_key)
+    # 1. Resolve the generation model (API keys are read from the environment)
+    provider, provider_model = _get_generation_provider(model_name)
 
     # 2. Define the master list of possible magical elements
     master_element_list = [
@@ -36,16 +47,7 @@ def generate_spell_tasks(num_tasks=10, output_file="spell_scripting_tasks.json")
         "Order", "Life", "Death", "Arcane", "Rune", "Illusion", "Distortion"
     ]
 
-    # 3. Configure the generation model and craft the prompt
-    generation_config = genai.GenerationConfig(
-        temperature=1.0,
-        response_mime_type="application/json"
-    )
-    model = genai.GenerativeModel(
-        'gemini-2.5-flash-preview-05-20',
-        generation_config=generation_config
-    )
-
+    # 3. Craft the prompt
     prompt = f"""
     You are a creative loremaster for a fantasy world.
     Generate a list of exactly {num_tasks} short, imaginative descriptions of magical spells.
@@ -54,16 +56,16 @@ def generate_spell_tasks(num_tasks=10, output_file="spell_scripting_tasks.json")
     Return your response as a single JSON object with one key, "spells", which contains a list of strings.
     """
 
-    print(f"Sending prompt to Gemini to generate {num_tasks} spell descriptions...")
+    print(f"Sending prompt to '{model_name}' to generate {num_tasks} spell descriptions...")
 
     try:
-        response = model.generate_content(prompt)
-        response_data = json.loads(response.text)
+        response_text = provider.generate(provider_model, prompt, json_mode=True, temperature=1.0)
+        response_data = json.loads(response_text)
         spell_descriptions = response_data.get("spells", [])
 
         if not spell_descriptions or len(spell_descriptions) != num_tasks:
             print(f"ERROR: Model returned an unexpected format or number of spells. Got {len(spell_descriptions)}.")
-            print(f"Raw response: {response.text}")
+            print(f"Raw response: {response_text}")
             sys.exit(1)
             
         print(f"Successfully received {len(spell_descriptions)} spell descriptions.")
@@ -144,10 +146,15 @@ def generate_element_editing_tasks(num_tasks=10, output_file="element_editing_ta
     print(f"Successfully generated and saved {len(final_tasks)} 'elementEditing' tasks to '{output_file}'.")
 
 
-def generate_automata_scripting_tasks(num_tasks=10, output_file="automata_scripting_tasks.json"):
+def generate_automata_scripting_tasks(num_tasks=10, output_file="automata_scripting_tasks.json", model_name=GENERATION_MODEL_NAME,
+                                      prune_context=False):
     """
     Generates synthetic tasks for an "automataScripting" model.
     This version sequentially builds the context for each task in the series.
+
+    With prune_context=True each task's context is reduced by prune_automata_context
+    to the base materials plus those relevant to its input, and the rest are listed
+    by name only, so context size stays roughly flat over a long series.
     """
     print("\n--- Starting Synthetic Automata Scripting Task Generation ---")
     
@@ -157,21 +164,8 @@ def generate_automata_scripting_tasks(num_tasks=10, output_file="automata_script
     """
     base_automata_context = json.loads(context_json_string)
 
-    # 2. Configure Gemini API
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        print("API key not found, assuming it's configured from a previous step.")
-    else:
-        genai.configure(api_key=api_key)
-
-    generation_config = genai.GenerationConfig(
-        temperature=0.9,
-        response_mime_type="application/json"
-    )
-    model = genai.GenerativeModel(
-        'gemini-2.5-flash-preview-05-20',
-        generation_config=generation_config
-    )
+    # 2. Resolve the generation model (API keys are read from the environment)
+    provider, provider_model = _get_generation_provider(model_name)
 
     prompt = f"""
     You are a game designer creating a complex, interconnected system of materials for a 2D falling-sand cellular automata simulation.
@@ -191,11 +185,11 @@ def generate_automata_scripting_tasks(num_tasks=10, output_file="automata_script
     Example: {{"descriptions": [{{"material_name": "seed", "behavior_description": "A seed..."}}]}}
     """
 
-    print(f"Sending prompt to Gemini to generate {num_tasks} interconnected material descriptions...")
+    print(f"Sending prompt to '{model_name}' to generate {num_tasks} interconnected material descriptions...")
 
     try:
-        response = model.generate_content(prompt)
-        response_data = json.loads(response.text)
+        response_text = provider.generate(provider_model, prompt, json_mode=True, temperature=0.9)
+        response_data = json.loads(response_text)
         material_data = response_data.get("descriptions", [])
 
         if not material_data or len(material_data) != num_tasks:
@@ -214,10 +208,15 @@ def generate_automata_scripting_tasks(num_tasks=10, output_file="automata_script
             behavior_description = item.get("behavior_description")
 
             # Create the task with the context *as it currently exists*
-            # We use deepcopy to ensure each task has a snapshot of the context at that moment
+            # Existing behaviours are never modified (only new materials are added),
+            # so a shallow copy is an independent snapshot of the context at this step.
+            if prune_context:
+                task_context = prune_automata_context(current_context, behavior_description)
+            else:
+                task_context = dict(current_context)
             task_pair = {
                 "input": behavior_description,
-                "context": copy.deepcopy(current_context)
+                "context": task_context
             }
             final_tasks.append(task_pair)
             
@@ -239,7 +238,7 @@ def generate_automata_scripting_tasks(num_tasks=10, output_file="automata_script
 
 if __name__ == "__main__":
     # Ensure you have the library installed: pip install google-generativeai
-    # Ensure your GEMINI_API_KEY environment variable is set.
+    # Ensure your GEMINI_API_KEY environment variable is set (or pass model_name='mock:generator').
     
     generate_spell_tasks(num_tasks=10)
     generate_element_editing_tasks(num_tasks=10)
@@ -1,22 +1,64 @@
+import re
 import sqlite3
 import logging
+import argparse
+
+from text_compression import (TextCodec, CompressionConfigError, COMPRESSED_COLUMNS, CODECS,
+                              DEFAULT_MIN_BYTES, train_zstd_dictionary)
 
 # Configure basic logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def create_connection(db_file):
+# --- Connection Factory ---
+# Pragma profiles applied by create_connection, in order. WAL lets readers (the
+# notebook, judges) keep working while another connection writes, and with
+# synchronous=NORMAL a crash can lose only the last commits, never corrupt the
+# file, while skipping an fsync per transaction. busy_timeout (ms) makes a writer
+# wait for a lock instead of failing with 'database is locked'. Larger pages
+# suit rows carrying whole JSON contexts; page_size only takes effect on a new
+# database, so it comes before the switch to WAL. Negative cache_size is in KiB.
+DEFAULT_PRAGMAS = (
+    ("page_size", 16384),
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("busy_timeout", 30000),
+    ("cache_size", -65536),
+    ("mmap_size", 268435456),
+    ("temp_store", "MEMORY"),
+)
+PRAGMA_PROFILES = {
+    "default": DEFAULT_PRAGMAS,
+    # Checkpointing every 4096 pages keeps the WAL from being copied back in many
+    # small steps during large loads.
+    "bulk_ingest": DEFAULT_PRAGMAS + (("wal_autocheckpoint", 4096),),
+}
+
+def apply_pragma_profile(conn, profile="default"):
+    """Applies one of PRAGMA_PROFILES to a connection."""
+    for name, value in PRAGMA_PROFILES[profile]:
+        conn.execute(f"PRAGMA {name}={value};")
+
+def create_connection(db_file, check_same_thread=True, profile="default"):
     """
     Create a database connection to a SQLite database specified by db_file.
+    The pragmas of `profile` are applied and the compress()/decompress() SQL
+    functions are registered on it (see register_compression_functions).
 
     Args:
         db_file (str): Path to the database file.
+        check_same_thread (bool): Passed to sqlite3.connect; False lets another
+            thread use the connection (one at a time).
+        profile (str): A PRAGMA_PROFILES name, or None for SQLite's defaults.
 
     Returns:
         sqlite3.Connection: Connection object or None if an error occurs.
     """
     conn = None
     try:
-        conn = sqlite3.connect(db_file)
+        conn = sqlite3.connect(db_file, check_same_thread=check_same_thread)
+        if profile:
+            apply_pragma_profile(conn, profile)
+        register_compression_functions(conn)
         logging.info(f"Successfully connected to SQLite database: {db_file}")
         return conn
     except sqlite3.Error as e:
@@ -35,6 +77,9 @@ def create_db_tables(conn):
         logging.error("Connection object is not valid. Cannot create tables.")
         return
 
+    # input and context are kept once per problem in the 'problems' table. The
+    # responses columns remain for databases written before it existed; new rows
+    # leave them NULL. Read rows through the 'responses_full' view.
     create_table_sql = """
     CREATE TABLE IF NOT EXISTS responses (
         row_id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -49,7 +94,15 @@ def create_db_tables(conn):
         judge_scores_json TEXT,
         judge_rationales_json TEXT,
         judged_at DATETIME,
-        ingested_at DATETIME NOT NULL
+        ingested_at DATETIME NOT NULL,
+        telemetry_json TEXT,
+        validation_status TEXT,
+        task_type TEXT,
+        worker_id TEXT,
+        lease_expires_at REAL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT,
+        next_attempt_at REAL
     );
     """
     create_unique_source_index_sql = """
@@ -60,34 +113,566 @@ def create_db_tables(conn):
     CREATE INDEX IF NOT EXISTS idx_problem_hash
     ON responses (problem_hash);
     """
+    # Judging batches select by status (and task type); breakdowns and
+    # leaderboards group by model, task type and status.
+    create_status_task_type_index_sql = """
+    CREATE INDEX IF NOT EXISTS idx_status_task_type
+    ON responses (status, task_type);
+    """
+    create_group_task_type_status_index_sql = """
+    CREATE INDEX IF NOT EXISTS idx_group_task_type_status
+    ON responses (group_name, task_type, status);
+    """
+    create_validation_status_index_sql = """
+    CREATE INDEX IF NOT EXISTS idx_validation_status
+    ON responses (validation_status);
+    """
+    # One row per judge score, so aggregations read an index instead of parsing
+    # judge_scores_json (which is still written, for compatibility).
+    create_scores_sql = """
+    CREATE TABLE IF NOT EXISTS scores (
+        row_id INTEGER NOT NULL,
+        criterion TEXT NOT NULL,
+        value REAL,
+        PRIMARY KEY (row_id, criterion)
+    ) WITHOUT ROWID;
+    """
+    create_scores_criterion_index_sql = """
+    CREATE INDEX IF NOT EXISTS idx_scores_criterion
+    ON scores (criterion, row_id, value);
+    """
+    create_problems_sql = """
+    CREATE TABLE IF NOT EXISTS problems (
+        problem_hash TEXT PRIMARY KEY,
+        input TEXT,
+        context TEXT
+    );
+    """
+    # Database-wide settings, e.g. the compression codec and zstd dictionaries.
+    create_db_meta_sql = """
+    CREATE TABLE IF NOT EXISTS db_meta (
+        key TEXT PRIMARY KEY,
+        value
+    );
+    """
+    # One row per ingested log file: its size and mtime when last ingested, and the
+    # SHA-256 of the bytes up to parsed_offset (the end of the last complete section).
+    create_ingest_manifest_sql = """
+    CREATE TABLE IF NOT EXISTS ingest_manifest (
+        file_path TEXT PRIMARY KEY,
+        group_name TEXT NOT NULL,
+        session_name TEXT NOT NULL,
+        size_bytes INTEGER NOT NULL,
+        mtime REAL NOT NULL,
+        content_hash TEXT NOT NULL,
+        parsed_offset INTEGER NOT NULL,
+        ingested_at DATETIME NOT NULL
+    );
+    """
     try:
         cursor = conn.cursor()
         logging.info("Creating 'responses' table if it doesn't exist...")
         cursor.execute(create_table_sql)
+        # Databases created before a column was added are migrated in place.
+        ensure_column(conn, "responses", "telemetry_json", "TEXT")
+        ensure_column(conn, "responses", "validation_status", "TEXT")
+        if ensure_column(conn, "responses", "task_type", "TEXT"):
+            migrate_task_types(conn)
+        # Judge work queue: the worker holding an 'in_progress' row, and until when (Unix time).
+        ensure_column(conn, "responses", "worker_id", "TEXT")
+        ensure_column(conn, "responses", "lease_expires_at", "REAL")
+        # Retry accounting: claims so far, the last failure, and when to retry (Unix time).
+        ensure_column(conn, "responses", "attempts", "INTEGER NOT NULL DEFAULT 0")
+        ensure_column(conn, "responses", "last_error", "TEXT")
+        ensure_column(conn, "responses", "next_attempt_at", "REAL")
         logging.info("Creating unique index 'idx_source' for data ingestion...")
         cursor.execute(create_unique_source_index_sql)
         logging.info("Creating index 'idx_problem_hash' for analysis...")
         cursor.execute(create_problem_hash_index_sql)
+        logging.info("Creating indexes 'idx_status_task_type' and 'idx_group_task_type_status' for judging and analysis...")
+        cursor.execute(create_status_task_type_index_sql)
+        cursor.execute(create_group_task_type_status_index_sql)
+        logging.info("Creating index 'idx_validation_status' for analysis...")
+        cursor.execute(create_validation_status_index_sql)
+        logging.info("Creating 'scores' table if it doesn't exist...")
+        cursor.execute(create_scores_sql)
+        cursor.execute(create_scores_criterion_index_sql)
+        logging.info("Creating 'problems' table if it doesn't exist...")
+        cursor.execute(create_problems_sql)
+        logging.info("Creating 'ingest_manifest' table if it doesn't exist...")
+        cursor.execute(create_ingest_manifest_sql)
+        logging.info("Creating 'db_meta' table if it doesn't exist...")
+        cursor.execute(create_db_meta_sql)
+        create_responses_full_view(conn)
         conn.commit()
         logging.info("Database tables and indexes are set up successfully.")
     except sqlite3.Error as e:
         logging.error(f"Error creating database objects: {e}")
 
+def ensure_column(conn, table_name, column_name, column_definition):
+    """
+    Adds a column to an existing table if it is missing.
+
+    Args:
+        conn (sqlite3.Connection): An active SQLite connection.
+        table_name (str): The table to migrate.
+        column_name (str): The column that must exist.
+        column_definition (str): Its SQL type and constraints, e.g. 'TEXT'.
+
+    Returns:
+        bool: True if the column was added, False if it already existed.
+    """
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table_name});")]
+    if column_name in columns:
+        return False
+    logging.info(f"Migrating '{table_name}': adding column '{column_name}'...")
+    conn.execute(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_definition};")
+    return True
+
+TASK_TYPE_PATTERN = re.compile(r'^[a-zA-Z0-9]+')
+
+def extract_task_type(task_key):
+    """Returns the task type a task_key starts with ('spellScripting-...' -> 'spellScripting'), or None."""
+    match = TASK_TYPE_PATTERN.match(task_key or "")
+    return match.group(0) if match else None
+
+def migrate_task_types(conn):
+    """
+    Fills responses.task_type from task_key for rows that have none (rows ingested
+    before the column existed). Runs automatically when create_db_tables adds the
+    column. The caller commits.
+
+    Returns:
+        int: The number of rows updated.
+    """
+    logging.info("Migrating 'responses': extracting task_type from task_key...")
+    conn.create_function("extract_task_type", 1, extract_task_type, deterministic=True)
+    return conn.execute("UPDATE responses SET task_type = extract_task_type(task_key) WHERE task_type IS NULL;").rowcount
+
+def create_responses_full_view(conn):
+    """
+    (Re)creates the 'responses_full' view: every 'responses' column, with input and
+    context filled in from 'problems'. Rows not yet migrated keep their own copies,
+    which take precedence. Once compression has been configured, compressed
+    columns are read through decompress(), so the view always returns text; it
+    can then only be queried from a connection made by create_connection. Without
+    compression the view is plain SQL and works from any SQLite client (the
+    sqlite3 CLI, pandas). The view lists the current columns explicitly, so it is
+    rebuilt whenever create_db_tables runs (e.g. after a column is added) and
+    whenever the compression settings change.
+    """
+    settings = get_db_settings(conn)
+    if settings.get("compression_codec", "none") != "none" or settings.get("has_compressed_values"):
+        compressed = {column_name for table_name, column_name in COMPRESSED_COLUMNS if table_name == "responses"}
+    else:
+        compressed = set()
+    columns = []
+    for row in conn.execute("PRAGMA table_info(responses);"):
+        column_name = row[1]
+        if column_name in ("input", "context"):
+            expression = f"COALESCE(r.{column_name}, p.{column_name})"
+        else:
+            expression = f"r.{column_name}"
+        if column_name in compressed:
+            expression = f"decompress({expression})"
+        if expression != f"r.{column_name}":
+            expression += f" AS {column_name}"
+        columns.append(expression)
+    conn.execute("DROP VIEW IF EXISTS responses_full;")
+    conn.execute(f"""
+    CREATE VIEW responses_full AS
+    SELECT {', '.join(columns)}
+    FROM responses r LEFT JOIN problems p ON p.problem_hash = r.problem_hash;
+    """)
+
+def get_database_size(conn):
+    """Returns the size of the main database file in bytes (page_count * page_size)."""
+    page_count = conn.execute("PRAGMA page_count;").fetchone()[0]
+    page_size = conn.execute("PRAGMA page_size;").fetchone()[0]
+    return page_count * page_size
+
+def migrate_problems(conn, vacuum=False):
+    """
+    Moves input and context out of 'responses' into the 'problems' table.
+
+    Each distinct problem_hash is stored once; the responses rows then have their
+    input and context set to NULL. A row is only cleared if the stored problem
+    matches it exactly, so nothing is lost should two problems share a hash.
+    Safe to run repeatedly. Freed pages are reused by later inserts; vacuum=True
+    also shrinks the file (this rewrites the whole database).
+
+    Args:
+        conn (sqlite3.Connection): An active SQLite connection.
+        vacuum (bool): Run VACUUM afterwards.
+
+    Returns:
+        dict: 'problems_added', 'rows_cleared', and the database size in bytes
+              'bytes_before' / 'bytes_after' (equal unless vacuum=True).
+    """
+    create_db_tables(conn)
+    bytes_before = get_database_size(conn)
+    try:
+        changes_before = conn.total_changes
+        conn.execute("""
+        INSERT OR IGNORE INTO problems (problem_hash, input, context)
+        SELECT problem_hash, input, context FROM responses
+        WHERE input IS NOT NULL OR context IS NOT NULL;
+        """)
+        problems_added = conn.total_changes - changes_before
+        changes_before = conn.total_changes
+        conn.execute("""
+        UPDATE responses SET input = NULL, context = NULL
+        WHERE (input IS NOT NULL OR context IS NOT NULL)
+          AND EXISTS (SELECT 1 FROM problems p
+                      WHERE p.problem_hash = responses.problem_hash
+                        AND p.input IS responses.input
+                        AND decompress(p.context) IS decompress(responses.context));
+        """)
+        rows_cleared = conn.total_changes - changes_before
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.rollback()
+        logging.error(f"Problem migration failed and was rolled back: {e}")
+        return None
+    if vacuum:
+        logging.info("Vacuuming the database...")
+        conn.execute("VACUUM;")
+    result = {'problems_added': problems_added, 'rows_cleared': rows_cleared,
+              'bytes_before': bytes_before, 'bytes_after': get_database_size(conn)}
+    logging.info(f"Problem migration: {problems_added} problems added, {rows_cleared} responses rows cleared, "
+                 f"database {bytes_before / 1e6:.1f} MB -> {result['bytes_after'] / 1e6:.1f} MB.")
+    return result
+
+# --- Judge Scores ---
+# The key under which run_judging stores the programmatic validation result in
+# judge_scores_json. It goes to responses.validation_status, not to 'scores'.
+VALIDATION_SCORE_KEY = "programmatic_validation"
+
+def write_judge_scores(conn, row_id, scores):
+    """
+    Writes a judged row's scores into the 'scores' table (replacing any earlier
+    ones) and its programmatic validation result into responses.validation_status.
+    Non-numeric scores are skipped. The caller commits.
+
+    Args:
+        conn (sqlite3.Connection): An active SQLite connection.
+        row_id (int): The judged responses row.
+        scores (dict): criterion -> score, as in judge_scores_json.
+    """
+    conn.execute("DELETE FROM scores WHERE row_id = ?;", (row_id,))
+    conn.executemany(
+        "INSERT INTO scores (row_id, criterion, value) VALUES (?, ?, ?);",
+        [(row_id, criterion, value) for criterion, value in scores.items()
+         if criterion != VALIDATION_SCORE_KEY and isinstance(value, (int, float)) and not isinstance(value, bool)]
+    )
+    conn.execute("UPDATE responses SET validation_status = ? WHERE row_id = ?;",
+                 (scores.get(VALIDATION_SCORE_KEY), row_id))
+
+def backfill_scores(conn):
+    """
+    Fills 'scores' and responses.validation_status from judge_scores_json for
+    rows judged before they existed. Safe to run repeatedly.
+
+    Returns:
+        dict: 'rows' (judged rows processed) and 'scores' (score rows written), or None on error.
+    """
+    create_db_tables(conn)
+    try:
+        rows = conn.execute(f"""
+        UPDATE responses SET validation_status = json_extract(judge_scores_json, '$.{VALIDATION_SCORE_KEY}')
+        WHERE judge_scores_json IS NOT NULL;
+        """).rowcount
+        changes_before = conn.total_changes
+        conn.execute(f"""
+        INSERT OR REPLACE INTO scores (row_id, criterion, value)
+        SELECT r.row_id, j.key, j.value
+        FROM responses r, json_each(r.judge_scores_json) j
+        WHERE r.judge_scores_json IS NOT NULL
+          AND j.key != '{VALIDATION_SCORE_KEY}' AND j.type IN ('integer', 'real');
+        """)
+        score_rows = conn.total_changes - changes_before
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.rollback()
+        logging.error(f"Score backfill failed and was rolled back: {e}")
+        return None
+    logging.info(f"Score backfill: {rows} judged rows, {score_rows} score rows written.")
+    return {'rows': rows, 'scores': score_rows}
+
+def get_leaderboard(conn, task_type=None):
+    """
+    Ranks model groups by their mean judge score per criterion, read from the
+    'scores' table, with the programmatic validation pass rate alongside.
+
+    Args:
+        conn (sqlite3.Connection): An active SQLite connection.
+        task_type (str): Only count rows of this task type, e.g. 'spellScripting'.
+
+    Returns:
+        list[tuple]: (group_name, criterion, judged rows, mean score), ordered by
+                     group, plus one (group_name, 'validation_pass_rate', rows
+                     with a validation result, pass fraction) row per group.
+    """
+    task_filter = "AND r.task_type = ?" if task_type else ""
+    params = (task_type,) if task_type else ()
+    sql = f"""
+    SELECT r.group_name, s.criterion, COUNT(*), AVG(s.value)
+    FROM scores s JOIN responses r ON r.row_id = s.row_id
+    WHERE 1 = 1 {task_filter}
+    GROUP BY r.group_name, s.criterion
+    UNION ALL
+    SELECT r.group_name, 'validation_pass_rate', COUNT(*), AVG(r.validation_status = 'Passed')
+    FROM responses r
+    WHERE r.validation_status IN ('Passed', 'Failed') {task_filter}
+    GROUP BY r.group_name
+    ORDER BY 1, 2;
+    """
+    try:
+        rows = conn.execute(sql, params * 2).fetchall()
+        logging.info("Leaderboard" + (f" for '{task_type}'" if task_type else "") + ":")
+        if not rows:
+            logging.info("  No judged records found.")
+        for group, criterion, count, mean in rows:
+            logging.info(f"  - {group} / {criterion}: {mean:.2f} over {count} rows")
+        return rows
+    except sqlite3.Error as e:
+        logging.error(f"Failed to build leaderboard: {e}")
+        return []
+
+def requeue_failed_records(conn, task_type=None, group_name=None, error_contains=None):
+    """
+    Returns 'failed' records to 'pending' with their attempt count reset, e.g.
+    after fixing a prompt or switching judge model. last_error is kept until the
+    next attempt.
+
+    Args:
+        conn (sqlite3.Connection): An active SQLite connection.
+        task_type (str): Only requeue records of this task type.
+        group_name (str): Only requeue records of this model group.
+        error_contains (str): Only requeue records whose last_error contains this text.
+
+    Returns:
+        int: The number of records requeued.
+    """
+    conditions = ["status = 'failed'"]
+    params = []
+    if task_type:
+        conditions.append("task_type = ?")
+        params.append(task_type)
+    if group_name:
+        conditions.append("group_name = ?")
+        params.append(group_name)
+    if error_contains:
+        conditions.append("instr(last_error, ?) > 0")
+        params.append(error_contains)
+    sql = f"""
+    UPDATE responses
+    SET status = 'pending', attempts = 0, next_attempt_at = NULL, worker_id = NULL, lease_expires_at = NULL
+    WHERE {' AND '.join(conditions)};
+    """
+    try:
+        requeued = conn.execute(sql, params).rowcount
+        conn.commit()
+        logging.info(f"Requeued {requeued} failed records.")
+        return requeued
+    except sqlite3.Error as e:
+        logging.error(f"Failed to requeue records: {e}")
+        return 0
+
+def get_failure_summary(conn, limit=20):
+    """Returns the most common last_error values of 'failed' records as (last_error, count) rows."""
+    sql = """
+    SELECT last_error, COUNT(*) FROM responses
+    WHERE status = 'failed'
+    GROUP BY last_error ORDER BY COUNT(*) DESC LIMIT ?;
+    """
+    try:
+        rows = conn.execute(sql, (limit,)).fetchall()
+        logging.info("Failed records by last error:")
+        if not rows:
+            logging.info("  No failed records.")
+        for last_error, count in rows:
+            logging.info(f"  - {count} x {last_error}")
+        return rows
+    except sqlite3.Error as e:
+        logging.error(f"Failed to summarise failures: {e}")
+        return []
+
+# --- Settings and Compression ---
+
+def get_db_settings(conn):
+    """Returns the db_meta table as a dict ({} if the table does not exist yet)."""
+    try:
+        return dict(conn.execute("SELECT key, value FROM db_meta;").fetchall())
+    except sqlite3.OperationalError:
+        return {}
+
+def set_db_setting(conn, key, value):
+    """Stores one db_meta setting (None deletes it). The caller commits."""
+    if value is None:
+        conn.execute("DELETE FROM db_meta WHERE key = ?;", (key,))
+    else:
+        conn.execute("INSERT OR REPLACE INTO db_meta (key, value) VALUES (?, ?);", (key, value))
+
+def load_text_codec(settings, strict=False):
+    """
+    Builds the TextCodec described by db_meta settings.
+
+    Every stored zstd dictionary is loaded for decoding. If the configured codec
+    is unavailable here (zstd without the 'zstandard' package), new values are
+    left uncompressed instead, unless strict=True.
+    """
+    dictionaries = {int(key.split(":", 1)[1]): value for key, value in settings.items()
+                    if key.startswith("zstd_dictionary:")}
+    dictionary_id = settings.get("zstd_dictionary_id")
+    try:
+        return TextCodec(settings.get("compression_codec", "none"),
+                         level=settings.get("compression_level"),
+                         min_bytes=settings.get("compression_min_bytes", DEFAULT_MIN_BYTES),
+                         dictionaries=dictionaries,
+                         dictionary_id=int(dictionary_id) if dictionary_id is not None else None)
+    except CompressionConfigError as e:
+        if strict:
+            raise
+        logging.warning(f"{e} New values will not be compressed.")
+        return TextCodec("none", dictionaries=dictionaries)
+
+def register_compression_functions(conn):
+    """
+    Registers compress(text) and decompress(value) on a connection, using the
+    codec configured in db_meta when the connection was opened. Writers store
+    large text with compress(?) and readers use decompress(column) (or the
+    responses_full view), so queries such as json_extract still see text.
+
+    Returns:
+        TextCodec: The codec behind the functions.
+    """
+    codec = load_text_codec(get_db_settings(conn))
+    conn.create_function("compress", 1, codec.compress, deterministic=True)
+    conn.create_function("decompress", 1, codec.decompress, deterministic=True)
+    return codec
+
+def get_compressed_size(conn):
+    """Returns (stored bytes, text bytes) of the COMPRESSED_COLUMNS values."""
+    stored = text = 0
+    for table_name, column_name in COMPRESSED_COLUMNS:
+        row = conn.execute(f"SELECT SUM(length(CAST({column_name} AS BLOB))), "
+                           f"SUM(length(CAST(decompress({column_name}) AS BLOB))) FROM {table_name};").fetchone()
+        stored += row[0] or 0
+        text += row[1] or 0
+    return stored, text
+
+def recompress_columns(conn, vacuum=False):
+    """
+    Rewrites every COMPRESSED_COLUMNS value with the connection's current codec:
+    text is compressed, and values written with another codec or dictionary are
+    re-encoded (with codec 'none', everything is decompressed back to text).
+
+    Returns:
+        dict: Stored/text byte totals 'stored_before', 'stored_after',
+              'text_bytes' and the database file size 'bytes_after'.
+    """
+    stored_before, text_bytes = get_compressed_size(conn)
+    try:
+        for table_name, column_name in COMPRESSED_COLUMNS:
+            logging.info(f"Re-encoding '{table_name}.{column_name}'...")
+            conn.execute(f"UPDATE {table_name} SET {column_name} = compress(decompress({column_name})) "
+                         f"WHERE {column_name} IS NOT NULL;")
+        if get_db_settings(conn).get("compression_codec", "none") == "none":
+            # Everything is text again, so responses_full no longer needs decompress().
+            set_db_setting(conn, "has_compressed_values", None)
+            create_responses_full_view(conn)
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.rollback()
+        logging.error(f"Re-encoding failed and was rolled back: {e}")
+        return None
+    if vacuum:
+        logging.info("Vacuuming the database...")
+        conn.execute("VACUUM;")
+    stored_after, _ = get_compressed_size(conn)
+    result = {'stored_before': stored_before, 'stored_after': stored_after, 'text_bytes': text_bytes,
+              'bytes_after': get_database_size(conn)}
+    logging.info(f"Large text columns: {text_bytes / 1e6:.1f} MB of text stored in {stored_after / 1e6:.1f} MB "
+                 f"(was {stored_before / 1e6:.1f} MB); database file {result['bytes_after'] / 1e6:.1f} MB.")
+    return result
+
+def configure_compression(conn, codec, level=None, min_bytes=DEFAULT_MIN_BYTES, train_dictionary=False,
+                          sample_limit=2000, recompress=True, vacuum=False):
+    """
+    Sets the compression codec of a database and, optionally, re-encodes its data.
+
+    The setting is stored in db_meta, so every connection opened afterwards
+    writes with it; already-open connections keep their codec until reopened.
+
+    Args:
+        conn (sqlite3.Connection): An active SQLite connection.
+        codec (str): 'none', 'zlib' or 'zstd' ('zstd' needs the 'zstandard' package).
+        level (int): Compression level, or None for the codec's default.
+        min_bytes (int): Values shorter than this stay uncompressed text.
+        train_dictionary (bool): With zstd, train a dictionary on up to
+            sample_limit values of each compressed column and use it.
+        recompress (bool): Re-encode the existing values (see recompress_columns).
+        vacuum (bool): VACUUM afterwards so the file actually shrinks.
+
+    Returns:
+        dict: The recompress_columns result, or None if recompress=False.
+    """
+    create_db_tables(conn)
+    settings = {"compression_codec": codec, "compression_level": level, "compression_min_bytes": min_bytes,
+                "zstd_dictionary_id": None}
+    dictionary_entry = None
+    if codec == "zstd" and train_dictionary:
+        samples = []
+        for table_name, column_name in COMPRESSED_COLUMNS:
+            samples.extend(value for (value,) in conn.execute(
+                f"SELECT decompress({column_name}) FROM {table_name} WHERE {column_name} IS NOT NULL "
+                f"ORDER BY random() LIMIT ?;", (sample_limit,)))
+        logging.info(f"Training a zstd dictionary on {len(samples)} samples...")
+        dictionary_id, dictionary_bytes = train_zstd_dictionary(samples)
+        settings["zstd_dictionary_id"] = dictionary_id
+        dictionary_entry = (f"zstd_dictionary:{dictionary_id}", dictionary_bytes)
+    # Fails here, before anything is stored, if the codec cannot be used.
+    load_text_codec({**get_db_settings(conn), **settings,
+                     **(dict([dictionary_entry]) if dictionary_entry else {})}, strict=True)
+
+    for key, value in settings.items():
+        set_db_setting(conn, key, value)
+    if codec != "none":
+        # Kept until the data is decompressed again, even if the codec is later set to 'none'.
+        set_db_setting(conn, "has_compressed_values", "1")
+    if dictionary_entry:
+        # Old dictionaries are kept: values compressed with them stay readable.
+        set_db_setting(conn, *dictionary_entry)
+    create_responses_full_view(conn)
+    conn.commit()
+    register_compression_functions(conn)
+    logging.info(f"Compression set to '{codec}'" + (f" with dictionary {settings['zstd_dictionary_id']}." if dictionary_entry else "."))
+    return recompress_columns(conn, vacuum=vacuum) if recompress else None
+
 # --- New Utility Functions ---
 
 def clear_all_responses(conn):
     """
-    Deletes all records from the 'responses' table and resets the autoincrement sequence.
+    Deletes all records from the 'responses', 'problems' and 'scores' tables and
+    the ingest manifest (so the same logs can be ingested again), and resets the
+    autoincrement sequence.
     
     Args:
         conn (sqlite3.Connection): An active SQLite connection.
     """
     sql_delete = "DELETE FROM responses;"
+    sql_delete_problems = "DELETE FROM problems;"
+    sql_delete_scores = "DELETE FROM scores;"
+    sql_delete_manifest = "DELETE FROM ingest_manifest;"
     sql_reset_sequence = "DELETE FROM sqlite_sequence WHERE name='responses';"
     try:
         cursor = conn.cursor()
         logging.warning("Clearing all records from the 'responses' table.")
         cursor.execute(sql_delete)
+        cursor.execute(sql_delete_problems)
+        cursor.execute(sql_delete_scores)
+        cursor.execute(sql_delete_manifest)
         # Reset the autoincrement counter so new records start from 1
         cursor.execute(sql_reset_sequence)
         conn.commit()
@@ -107,9 +692,15 @@ def get_record_count(conn):
         logging.error(f"Failed to count records: {e}")
         return -1
 
-def get_status_breakdown(conn):
-    """Gets the count of records for each status."""
-    sql = "SELECT status, COUNT(*) FROM responses GROUP BY status;"
+def get_status_breakdown(conn, by_task_type=False):
+    """
+    Gets the count of records for each status (and task type, if by_task_type).
+    Both are answered from the idx_status_task_type index.
+    """
+    if by_task_type:
+        sql = "SELECT status, task_type, COUNT(*) FROM responses GROUP BY status, task_type;"
+    else:
+        sql = "SELECT status, COUNT(*) FROM responses GROUP BY status;"
     try:
         cursor = conn.cursor()
         cursor.execute(sql)
@@ -118,7 +709,10 @@ def get_status_breakdown(conn):
         if not rows:
             logging.info("  No records found.")
         for row in rows:
-            logging.info(f"  - Status: {row[0]}, Count: {row[1]}")
+            if by_task_type:
+                logging.info(f"  - Status: {row[0]}, Task type: {row[1]}, Count: {row[2]}")
+            else:
+                logging.info(f"  - Status: {row[0]}, Count: {row[1]}")
         return rows
     except sqlite3.Error as e:
         logging.error(f"Failed to get status breakdown: {e}")
@@ -142,12 +736,55 @@ def show_all_records(conn, limit=10):
         logging.error(f"Failed to fetch records: {e}")
         return []
 
+def get_telemetry_summary(conn):
+    """
+    Summarises the recorded call telemetry per model group and task type.
 
-if __name__ == '__main__':
-    DB_FILE = "judgements.db"
-    
-    logging.info(f"--- Running Full Utility Demo for {DB_FILE} ---")
-    connection = create_connection(DB_FILE)
+    Rows ingested without telemetry, and cache hits, are left out.
+
+    Returns:
+        list[tuple]: (group_name, task_type, calls, mean latency s, mean TTFT s,
+                      input tokens, output tokens, cached tokens, cached-token ratio,
+                      output tokens/s)
+    """
+    sql = """
+    SELECT
+        group_name,
+        task_type,
+        COUNT(*),
+        AVG(json_extract(telemetry_json, '$.latency_s')),
+        AVG(json_extract(telemetry_json, '$.ttft_s')),
+        SUM(json_extract(telemetry_json, '$.input_tokens')),
+        SUM(json_extract(telemetry_json, '$.output_tokens')),
+        SUM(json_extract(telemetry_json, '$.cached_tokens')),
+        1.0 * SUM(json_extract(telemetry_json, '$.cached_tokens')) / SUM(json_extract(telemetry_json, '$.input_tokens')),
+        SUM(json_extract(telemetry_json, '$.output_tokens')) / SUM(json_extract(telemetry_json, '$.latency_s'))
+    FROM responses
+    WHERE telemetry_json IS NOT NULL AND json_extract(telemetry_json, '$.cache_hit') IS NULL
+    GROUP BY 1, 2
+    ORDER BY 1, 2;
+    """
+    try:
+        rows = conn.execute(sql).fetchall()
+        logging.info("Telemetry by group and task type:")
+        if not rows:
+            logging.info("  No telemetry recorded.")
+        for group, task_type, calls, latency, ttft, tokens_in, tokens_out, tokens_cached, cached_ratio, throughput in rows:
+            ttft_str = f"{ttft:.2f}s" if ttft is not None else "n/a"
+            throughput_str = f"{throughput:.1f}" if throughput is not None else "n/a"
+            cached_str = f"{cached_ratio:.0%}" if cached_ratio is not None else "n/a"
+            logging.info(f"  - {group} / {task_type}: {calls} calls, mean latency {latency:.2f}s, mean TTFT {ttft_str}, "
+                         f"tokens in/out/cached {tokens_in}/{tokens_out}/{tokens_cached} ({cached_str} cached), {throughput_str} output tokens/s")
+        return rows
+    except sqlite3.Error as e:
+        logging.error(f"Failed to summarise telemetry: {e}")
+        return []
+
+
+def run_demo(db_file):
+    """Runs the utility demo: set up, clear and inspect the database."""
+    logging.info(f"--- Running Full Utility Demo for {db_file} ---")
+    connection = create_connection(db_file)
 
     if connection:
         # 1. Setup the database tables and indexes
@@ -171,9 +808,87 @@ if __name__ == '__main__':
         print("\n--- 4. Current State (after potential ingestion) ---")
         get_record_count(connection)
         get_status_breakdown(connection)
+        get_telemetry_summary(connection)
         show_all_records(connection, limit=5)
         
         connection.close()
         logging.info("--- Demo complete. Connection closed. ---")
     else:
-        logging.error("--- Demo failed. Could not connect to database. ---")
\ No newline at end of file
+        logging.error("--- Demo failed. Could not connect to database. ---")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Database utilities for judgements.db.")
+    parser.add_argument("--db_file", default="judgements.db", help="Path to the SQLite database.")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("demo", help="Set up, clear and inspect the database (the default).")
+    migrate_parser = subparsers.add_parser("migrate-problems", help="Move input/context into the deduplicated 'problems' table.")
+    migrate_parser.add_argument("--vacuum", action="store_true", help="Also VACUUM to shrink the file.")
+    subparsers.add_parser("migrate-task-types", help="Fill task_type from task_key for rows that have none.")
+    status_parser = subparsers.add_parser("status", help="Count records per status.")
+    status_parser.add_argument("--by_task_type", action="store_true", help="Also split the counts by task type.")
+    requeue_parser = subparsers.add_parser("requeue-failed", help="Return 'failed' records to 'pending' (attempts reset).")
+    requeue_parser.add_argument("--task_type", default=None, help="Only requeue this task type.")
+    requeue_parser.add_argument("--group_name", default=None, help="Only requeue this model group.")
+    requeue_parser.add_argument("--error_contains", default=None, help="Only requeue records whose last error contains this text.")
+    requeue_parser.add_argument("--dry_run", action="store_true", help="Only list the failed records by error.")
+    subparsers.add_parser("backfill-scores", help="Fill the 'scores' table and validation_status from judge_scores_json.")
+    leaderboard_parser = subparsers.add_parser("leaderboard", help="Mean judge score per model group and criterion.")
+    leaderboard_parser.add_argument("--task_type", default=None, help="Only include this task type, e.g. 'spellScripting'.")
+    compression_parser = subparsers.add_parser("set-compression", help="Set the codec for large text columns and re-encode them.")
+    compression_parser.add_argument("codec", choices=CODECS, help="'zstd' needs the 'zstandard' package.")
+    compression_parser.add_argument("--level", type=int, default=None, help="Compression level (default: the codec's).")
+    compression_parser.add_argument("--min_bytes", type=int, default=DEFAULT_MIN_BYTES, help="Leave shorter values as text.")
+    compression_parser.add_argument("--train_dictionary", action="store_true", help="With zstd: train a dictionary on the stored data.")
+    compression_parser.add_argument("--no_recompress", action="store_true", help="Only change the setting; existing values are left as they are.")
+    compression_parser.add_argument("--vacuum", action="store_true", help="Also VACUUM to shrink the file.")
+    args = parser.parse_args()
+
+    if args.command == "migrate-problems":
+        connection = create_connection(args.db_file)
+        if connection:
+            migrate_problems(connection, vacuum=args.vacuum)
+            connection.close()
+    elif args.command == "migrate-task-types":
+        connection = create_connection(args.db_file)
+        if connection:
+            create_db_tables(connection)
+            logging.info(f"{migrate_task_types(connection)} rows updated.")
+            connection.commit()
+            connection.close()
+    elif args.command == "status":
+        connection = create_connection(args.db_file)
+        if connection:
+            get_status_breakdown(connection, by_task_type=args.by_task_type)
+            connection.close()
+    elif args.command == "requeue-failed":
+        connection = create_connection(args.db_file)
+        if connection:
+            create_db_tables(connection)
+            get_failure_summary(connection)
+            if not args.dry_run:
+                requeue_failed_records(connection, task_type=args.task_type, group_name=args.group_name,
+                                       error_contains=args.error_contains)
+            connection.close()
+    elif args.command == "backfill-scores":
+        connection = create_connection(args.db_file)
+        if connection:
+            backfill_scores(connection)
+            connection.close()
+    elif args.command == "leaderboard":
+        connection = create_connection(args.db_file)
+        if connection:
+            get_leaderboard(connection, task_type=args.task_type)
+            connection.close()
+    elif args.command == "set-compression":
+        connection = create_connection(args.db_file)
+        if connection:
+            try:
+                configure_compression(connection, args.codec, level=args.level, min_bytes=args.min_bytes,
+                                      train_dictionary=args.train_dictionary, recompress=not args.no_recompress,
+                                      vacuum=args.vacuum)
+            except CompressionConfigError as e:
+                logging.error(f"Could not set compression: {e}")
+            connection.close()
+    else:
+        run_demo(args.db_file)
@@ -0,0 +1,156 @@
+import math
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Configure basic logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Default per-request timeout in seconds. Provider calls previously had none and
+# could hang for many minutes.
+DEFAULT_REQUEST_TIMEOUT = 300.0
+# Hedging only starts once a model has this many latency samples.
+MIN_HEDGE_SAMPLES = 20
+
+
+class LatencyHistogram:
+    """
+    A thread-safe latency histogram with logarithmically spaced buckets.
+
+    Buckets grow by 10% from 10ms, so percentile estimates are within ~10% of the
+    true value while memory stays constant however many samples are recorded.
+    """
+
+    MIN_SECONDS = 0.01
+    GROWTH = 1.1
+    NUM_BUCKETS = 150  # Covers 10ms up to ~45 minutes.
+
+    def __init__(self, name):
+        self.name = name
+        self.counts = [0] * self.NUM_BUCKETS
+        self.count = 0
+        self.total_seconds = 0.0
+        self.lock = threading.Lock()
+
+    def _bucket_for(self, seconds):
+        if seconds <= self.MIN_SECONDS:
+            return 0
+        index = int(math.log(seconds / self.MIN_SECONDS, self.GROWTH)) + 1
+        return min(index, self.NUM_BUCKETS - 1)
+
+    def _upper_bound(self, bucket):
+        return self.MIN_SECONDS * (self.GROWTH ** bucket)
+
+    def record(self, seconds):
+        """Adds one latency sample, in seconds."""
+        with self.lock:
+            self.counts[self._bucket_for(seconds)] += 1
+            self.count += 1
+            self.total_seconds += seconds
+
+    def percentile(self, p):
+        """
+        Estimates a latency percentile.
+
+        Args:
+            p (float): The percentile as a fraction, e.g. 0.95.
+
+        Returns:
+            float: The upper bound of the bucket holding that percentile, or None if empty.
+        """
+        with self.lock:
+            if self.count == 0:
+                return None
+            target = max(1, math.ceil(p * self.count))
+            running = 0
+            for bucket, bucket_count in enumerate(self.counts):
+                running += bucket_count
+                if running >= target:
+                    return self._upper_bound(bucket)
+            return self._upper_bound(self.NUM_BUCKETS - 1)
+
+    def summary(self):
+        """Returns a dict of sample count, mean, p50, p95 and p99 latency in seconds."""
+        mean = self.total_seconds / self.count if self.count else None
+        return {
+            'count': self.count,
+            'mean': mean,
+            'p50': self.percentile(0.50),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99),
+        }
+
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+def get_latency_histogram(model_name):
+    """Returns the shared latency histogram for a model, creating it on first use."""
+    with _histograms_lock:
+        histogram = _histograms.get(model_name)
+        if histogram is None:
+            histogram = LatencyHistogram(model_name)
+            _histograms[model_name] = histogram
+        return histogram
+
+
+# --- Hedged Requests ---
+# Attempts run on a dedicated pool so the calling thread can stop waiting on a
+# slow request. A losing attempt cannot be cancelled mid-flight (the SDK calls
+# are blocking); it runs to completion or its timeout and its result is discarded.
+
+_hedge_pool = ThreadPoolExecutor(max_workers=256, thread_name_prefix="hedge")
+hedge_stats = {'calls': 0, 'hedges_sent': 0, 'hedges_won': 0}
+_hedge_stats_lock = threading.Lock()
+
+def hedged_call(func, *args, histogram=None, hedge_percentile=None, max_hedges=1, **kwargs):
+    """
+    Calls func(*args, **kwargs), sending a duplicate if the first attempt is slow.
+
+    If the first attempt has not finished after the model's `hedge_percentile`
+    latency (taken from `histogram`), another identical attempt is started, up to
+    `max_hedges` extras. Whichever attempt succeeds first wins. Hedging is skipped
+    until the histogram has MIN_HEDGE_SAMPLES samples, or if hedge_percentile is None.
+
+    Returns:
+        The result of the first successful attempt.
+
+    Raises:
+        Exception: The error of the last attempt, if every attempt failed.
+    """
+    with _hedge_stats_lock:
+        hedge_stats['calls'] += 1
+
+    threshold = None
+    if hedge_percentile is not None and histogram is not None and histogram.count >= MIN_HEDGE_SAMPLES:
+        threshold = histogram.percentile(hedge_percentile)
+    if threshold is None:
+        return func(*args, **kwargs)
+
+    primary = _hedge_pool.submit(func, *args, **kwargs)
+    attempts = [primary]
+    hedges_sent = 0
+    last_error = None
+    while attempts:
+        can_hedge = hedges_sent < max_hedges
+        done, _ = wait(attempts, timeout=threshold if can_hedge else None, return_when=FIRST_COMPLETED)
+        if not done:
+            # The pending attempts are slower than the threshold; send a hedge.
+            hedges_sent += 1
+            with _hedge_stats_lock:
+                hedge_stats['hedges_sent'] += 1
+            logging.debug(f"[{histogram.name}] Request slower than p{hedge_percentile * 100:.0f} ({threshold:.2f}s); sending a hedge.")
+            attempts.append(_hedge_pool.submit(func, *args, **kwargs))
+            continue
+        for future in done:
+            attempts.remove(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                last_error = e
+                continue
+            if future is not primary:
+                with _hedge_stats_lock:
+                    hedge_stats['hedges_won'] += 1
+            return result
+    raise last_error
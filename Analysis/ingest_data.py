@@ -1,12 +1,17 @@
 import os
 import re
+import mmap
+import queue
 import hashlib
 import sqlite3
 import logging
+import itertools
+import threading
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 
 # Import the database utility function from our other script
-from db_utils import create_connection
+from db_utils import create_connection, create_db_tables, extract_task_type
 
 # Configure basic logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -64,48 +69,139 @@ response::{"text": "model 2 response to task 3"}
     logging.info("Dummy data created successfully.")
 
 
-def parse_custom_log_format(file_path):
+# --- Log Parsing ---
+# A section is a '[task_key]' header line, then 'key::value' fields, then an
+# END_SECTION_MARKER line. Only a known field name at the very start of a line
+# begins a new field, so values (e.g. JSON responses) may contain '::' freely.
+
+END_SECTION_MARKER = '---END_SECTION---'
+LOG_FIELDS = ('input', 'context', 'response', 'telemetry')
+_FIELD_PREFIXES = tuple(f"{field}::" for field in LOG_FIELDS)
+_END_SECTION_MARKER_BYTES = END_SECTION_MARKER.encode('utf-8')
+
+
+def _parse_section_lines(lines):
+    """
+    Parses the decoded lines of one section (header first, end marker excluded) into a dict.
+    Values keep the original normalisation: each line is stripped, then the joined
+    value is stripped, so problem hashes of existing data do not change.
+    """
+    if not lines:
+        return None
+    section_data = {'task_key': lines[0].strip()[1:-1]}  # Get content inside brackets
+    current_key = None
+    current_value_lines = []
+
+    for line in lines[1:]:
+        if line.startswith(_FIELD_PREFIXES):
+            if current_key:
+                section_data[current_key] = '\n'.join(current_value_lines).strip()
+            current_key, value = line.split('::', 1)
+            current_value_lines = [value.strip()]
+        elif current_key:
+            current_value_lines.append(line.strip())
+
+    if current_key:
+        section_data[current_key] = '\n'.join(current_value_lines).strip()
+    return section_data
+
+
+def iter_log_sections(file_path, start_offset=0, use_mmap=False):
+    """
+    Streams the sections of a session log one at a time, with bounded memory.
+
+    Only the lines of the current section are held in memory. With use_mmap=True
+    the file is read through a memory map instead of buffered reads. A trailing
+    section without an end marker (e.g. one still being written) is not yielded.
+
+    Args:
+        file_path (str): Path to the session log.
+        start_offset (int): Byte offset to start reading from; must be the start
+            of a section (e.g. the end_offset of a previously yielded section).
+        use_mmap (bool): Read the file through mmap.
+
+    Yields:
+        tuple: (start_offset, end_offset, section dict) where the offsets are the
+               byte range of the section in the file, end marker included.
+    """
+    with open(file_path, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        if start_offset >= file_size:
+            return
+        reader = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if use_mmap else f
+        try:
+            reader.seek(start_offset)
+            section_start = start_offset
+            section_lines = []
+            while True:
+                raw_line = reader.readline()
+                if not raw_line:
+                    break
+                # Lines stay as bytes until the section is complete, then the section
+                # is decoded in one go; this is the hot loop of bulk ingestion.
+                if raw_line.strip() == _END_SECTION_MARKER_BYTES:
+                    end_offset = reader.tell()
+                    section_text = b''.join(section_lines).decode('utf-8', errors='replace')
+                    section_data = _parse_section_lines(section_text.split('\n'))
+                    if section_data is None:
+                        logging.warning(f"Empty section at bytes {section_start}-{end_offset} of '{file_path}'. Skipping.")
+                    elif not section_data['task_key']:
+                        logging.warning(f"Section without a '[task_key]' header at byte {section_start} of '{file_path}'. Skipping.")
+                    else:
+                        yield section_start, end_offset, section_data
+                    section_start = end_offset
+                    section_lines = []
+                    continue
+                if not section_lines and raw_line.isspace():
+                    # Blank lines between sections belong to the next one; skip them.
+                    section_start = reader.tell()
+                    continue
+                section_lines.append(raw_line)
+            if section_lines:
+                logging.warning(f"Incomplete section at byte {section_start} of '{file_path}' (no '{END_SECTION_MARKER}'). Skipping.")
+        finally:
+            if use_mmap:
+                reader.close()
+
+
+def normalize_log_value(value):
+    """
+    Normalises a value the way the log parser does (each line stripped, then the
+    whole value stripped), so rows written without a log round trip are identical
+    to ingested ones, problem_hash included.
+    """
+    return '\n'.join(line.strip() for line in str(value).split('\n')).strip()
+
+
+def parse_custom_log_format(file_path, use_mmap=False):
     """
     Parses the custom 'key::value' log format, handling multi-line JSON.
-    (Reused from the original script)
+    Returns every complete section as a list; use iter_log_sections to stream them.
     """
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        return [section_data for _, _, section_data in iter_log_sections(file_path, use_mmap=use_mmap)]
     except FileNotFoundError:
         logging.error(f"File not found: {file_path}")
         return []
 
-    parsed_sections = []
-    sections = content.strip().split('---END_SECTION---')
-
-    for section_text in sections:
-        section_text = section_text.strip()
-        if not section_text:
-            continue
-
-        lines = section_text.split('\n')
-        header = lines[0].strip()[1:-1] # Get content inside brackets
-        
-        section_data = {'task_key': header}
-        current_key = None
-        current_value_lines = []
-
-        for line in lines[1:]:
-            if '::' in line:
-                if current_key:
-                    section_data[current_key] = '\n'.join(current_value_lines).strip()
-                parts = line.split('::', 1)
-                current_key = parts[0].strip()
-                current_value_lines = [parts[1].strip()]
-            elif current_key:
-                current_value_lines.append(line.strip())
-        
-        if current_key:
-            section_data[current_key] = '\n'.join(current_value_lines).strip()
-        
-        parsed_sections.append(section_data)
-    return parsed_sections
+
+# --- Database Insertion ---
+
+# input and context are stored once per problem_hash in 'problems'; the responses
+# row only references them. Large text goes through the compress() SQL function
+# registered by create_connection (a no-op unless compression is configured).
+INSERT_PROBLEM_SQL = """
+    INSERT OR IGNORE INTO problems (problem_hash, input, context) VALUES (?, ?, compress(?));
+    """
+INSERT_RESPONSE_SQL = """
+    INSERT OR IGNORE INTO responses (
+        problem_hash, group_name, session_name, task_key, task_type,
+        model_response, ingested_at, telemetry_json
+    ) VALUES (?, ?, ?, ?, ?, compress(?), ?, ?);
+    """
+
+# Rows per executemany() call and per transaction during bulk ingestion.
+DEFAULT_BATCH_SIZE = 20000
 
 
 def insert_response(conn, response_data):
@@ -116,20 +212,21 @@ def insert_response(conn, response_data):
 
     Args:
         conn (sqlite3.Connection): An active SQLite connection.
-        response_data (dict): A dictionary containing all the data for the new row.
+        response_data (dict): problem_hash, group_name, session_name, task_key, input,
+            context, model_response, ingested_at and (optionally) telemetry_json.
 
     Returns:
         int: The rowid of the newly inserted row, or None if it was ignored.
     """
-    sql = """
-    INSERT OR IGNORE INTO responses (
-        problem_hash, group_name, session_name, task_key, input, context, 
-        model_response, ingested_at
-    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?);
-    """
     try:
         cursor = conn.cursor()
-        cursor.execute(sql, tuple(response_data.values()))
+        cursor.execute(INSERT_PROBLEM_SQL, (response_data['problem_hash'], response_data.get('input'),
+                                            response_data.get('context')))
+        cursor.execute(INSERT_RESPONSE_SQL, (
+            response_data['problem_hash'], response_data['group_name'], response_data['session_name'],
+            response_data['task_key'], extract_task_type(response_data['task_key']),
+            response_data.get('model_response'), response_data['ingested_at'],
+            response_data.get('telemetry_json')))
         # Return the last inserted rowid if a row was actually inserted
         return cursor.lastrowid if cursor.rowcount > 0 else None
     except sqlite3.Error as e:
@@ -137,63 +234,339 @@ def insert_response(conn, response_data):
         return None
 
 
-def ingest_log_files(db_file, master_folder):
+def build_response_row(group_name, session_name, task_data, ingested_at):
     """
-    Walks the data folder, parses all .txt files, and ingests them into the DB.
+    Builds the INSERT_PROBLEM_SQL and INSERT_RESPONSE_SQL parameter tuples for
+    one parsed log section.
+
+    Args:
+        group_name (str): The model group folder name.
+        session_name (str): The session file name without '.txt'.
+        task_data (dict): A section as yielded by iter_log_sections.
+        ingested_at (str): ISO 8601 timestamp shared by the whole ingestion run.
+
+    Returns:
+        tuple: (problem_row, response_row), as taken by insert_response_rows.
     """
-    logging.info(f"--- Starting Data Ingestion from '{master_folder}' ---")
-    conn = create_connection(db_file)
-    if not conn:
-        logging.error("Could not create database connection. Aborting ingestion.")
-        return
+    input_val = task_data.get('input', '')
+    context_val = task_data.get('context', '')
+    # Calculate the problem_hash for grouping
+    id_string = str(input_val) + str(context_val)
+    problem_hash = hashlib.sha256(id_string.encode('utf-8')).hexdigest()
+    problem_row = (problem_hash, input_val, context_val)
+    response_row = (
+        problem_hash,
+        group_name,
+        session_name,
+        task_data.get('task_key'),
+        extract_task_type(task_data.get('task_key')),
+        task_data.get('response', ''),
+        ingested_at,
+        # Call telemetry, present in logs written by prompting.py
+        task_data.get('telemetry'),
+    )
+    return problem_row, response_row
+
+
+def insert_response_rows(conn, rows):
+    """
+    Inserts rows built by build_response_row with executemany(). Each problem is
+    written once, however many rows of the batch share it.
+
+    Returns:
+        int: The number of responses rows inserted (the rest were duplicates).
+    """
+    problems = {problem_row[0]: problem_row for problem_row, _ in rows}
+    conn.executemany(INSERT_PROBLEM_SQL, problems.values())
+    changes_before = conn.total_changes
+    conn.executemany(INSERT_RESPONSE_SQL, (response_row for _, response_row in rows))
+    return conn.total_changes - changes_before
 
-    newly_inserted_count = 0
-    ignored_count = 0
 
-    # Walk through all groups and sessions in the master folder
+def iter_session_files(master_folder):
+    """Yields (group_name, session_name, file_path) for every master_folder/group/session.txt."""
     for group_name in os.listdir(master_folder):
         group_path = os.path.join(master_folder, group_name)
         if os.path.isdir(group_path):
             for session_name in os.listdir(group_path):
                 if session_name.endswith(".txt"):
-                    file_path = os.path.join(group_path, session_name)
-                    parsed_data = parse_custom_log_format(file_path)
-
-                    for task_data in parsed_data:
-                        # Prepare data for insertion
-                        input_val = task_data.get('input', '')
-                        context_val = task_data.get('context', '')
-                        
-                        # Calculate the problem_hash for grouping
-                        id_string = str(input_val) + str(context_val)
-                        problem_hash = hashlib.sha256(id_string.encode('utf-8')).hexdigest()
-
-                        record_to_insert = {
-                            "problem_hash": problem_hash,
-                            "group_name": group_name,
-                            "session_name": session_name.replace('.txt', ''),
-                            "task_key": task_data.get('task_key'),
-                            "input": input_val,
-                            "context": context_val,
-                            "model_response": task_data.get('response', ''),
-                            # UPDATED LINE: Convert datetime object to ISO 8601 string format
-                            "ingested_at": datetime.now().isoformat()
-                        }
-                        
-                        # Insert the record and check if it was new
-                        inserted_id = insert_response(conn, record_to_insert)
-                        if inserted_id:
-                            newly_inserted_count += 1
-                            logging.debug(f"Inserted new record with row_id {inserted_id}")
-                        else:
-                            ignored_count += 1
-    
-    # Commit all changes and close the connection
-    conn.commit()
-    conn.close()
-    
+                    yield group_name, session_name.replace('.txt', ''), os.path.join(group_path, session_name)
+
+
+UPSERT_MANIFEST_SQL = """
+    INSERT OR REPLACE INTO ingest_manifest (
+        file_path, group_name, session_name, size_bytes, mtime, content_hash, parsed_offset, ingested_at
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?);
+    """
+
+
+class IngestWriter:
+    """
+    The single database writer of an ingestion run.
+
+    Rows are inserted with executemany() and committed every batch_size rows.
+    Inserted and ignored (duplicate) counts are kept per file and per group, so
+    the serial and parallel paths report identical numbers. A file's ingest
+    manifest entry is written after its last rows, in the same transaction or a
+    later one, so a crash can only cause already-ingested rows to be re-read.
+    """
+
+    def __init__(self, conn, batch_size=DEFAULT_BATCH_SIZE):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.uncommitted_rows = 0
+        self.report = {'inserted': 0, 'ignored': 0, 'per_group': {}, 'per_file': {},
+                       'skipped_files': 0, 'tailed_files': 0}
+
+    def _count(self, group_name, file_path, inserted, ignored):
+        for bucket in (self.report,
+                       self.report['per_group'].setdefault(group_name, {'inserted': 0, 'ignored': 0}),
+                       self.report['per_file'].setdefault(file_path, {'inserted': 0, 'ignored': 0})):
+            bucket['inserted'] += inserted
+            bucket['ignored'] += ignored
+
+    def write_rows(self, group_name, file_path, rows, manifest_entry=None):
+        """
+        Inserts a list of rows from one file, committing once batch_size rows are
+        pending. manifest_entry, given with a file's last chunk, is the parameter
+        tuple for UPSERT_MANIFEST_SQL.
+        """
+        if rows:
+            inserted = insert_response_rows(self.conn, rows)
+            self._count(group_name, file_path, inserted, len(rows) - inserted)
+            self.uncommitted_rows += len(rows)
+        else:
+            self._count(group_name, file_path, 0, 0)
+        if manifest_entry:
+            self.conn.execute(UPSERT_MANIFEST_SQL, manifest_entry)
+        if self.uncommitted_rows >= self.batch_size:
+            self.commit()
+
+    def commit(self):
+        self.conn.commit()
+        self.uncommitted_rows = 0
+
+
+# --- Incremental Ingestion ---
+
+def _hash_file_prefix(file_path, length, block_size=1024 * 1024):
+    """Returns the SHA-256 hex digest of the first `length` bytes of a file."""
+    digest = hashlib.sha256()
+    remaining = length
+    with open(file_path, 'rb') as f:
+        while remaining > 0:
+            block = f.read(min(block_size, remaining))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+    return digest.hexdigest()
+
+
+def plan_ingestion(conn, master_folder, full_rescan=False):
+    """
+    Decides, for every log under master_folder, where ingestion should start.
+
+    Using the ingest_manifest table:
+    - a file whose size and mtime are unchanged is skipped;
+    - a file that grew and still starts with the bytes already ingested (a session
+      that is still being written) resumes from its last complete section;
+    - any other file (new, truncated or rewritten) is read from the start, and
+      INSERT OR IGNORE drops the rows that were already ingested.
+
+    Args:
+        conn (sqlite3.Connection): Connection to a database with ingest_manifest.
+        master_folder (str): The group/session.txt folder being ingested.
+        full_rescan (bool): Ignore the manifest and read every file from the start.
+
+    Returns:
+        tuple: (list of file dicts to ingest, number of skipped files, number of tailed files)
+    """
+    manifest = {}
+    if not full_rescan:
+        for file_path, size_bytes, mtime, content_hash, parsed_offset in conn.execute(
+                "SELECT file_path, size_bytes, mtime, content_hash, parsed_offset FROM ingest_manifest;"):
+            manifest[file_path] = (size_bytes, mtime, content_hash, parsed_offset)
+
+    files = []
+    skipped = 0
+    tailed = 0
+    for group_name, session_name, file_path in iter_session_files(master_folder):
+        # Stat before parsing: if the file grows while it is being read, the next run
+        # sees a newer size and picks up from parsed_offset.
+        stat = os.stat(file_path)
+        start_offset = 0
+        previous = manifest.get(os.path.abspath(file_path))
+        if previous:
+            size_bytes, mtime, content_hash, parsed_offset = previous
+            if stat.st_size == size_bytes and stat.st_mtime == mtime:
+                skipped += 1
+                continue
+            if stat.st_size >= parsed_offset and _hash_file_prefix(file_path, parsed_offset) == content_hash:
+                start_offset = parsed_offset
+                tailed += 1
+            else:
+                logging.info(f"'{file_path}' changed before its last ingested offset; re-reading it from the start.")
+        files.append({'group_name': group_name, 'session_name': session_name, 'file_path': file_path,
+                      'start_offset': start_offset, 'size_bytes': stat.st_size, 'mtime': stat.st_mtime})
+    return files, skipped, tailed
+
+
+def parse_session_chunk(group_name, session_name, file_path, ingested_at, start_offset=0, max_rows=DEFAULT_BATCH_SIZE):
+    """
+    Parses and hashes up to max_rows sections of one log, starting at start_offset.
+    This is the unit of work of parallel ingestion; it runs in a worker process.
+
+    Returns:
+        tuple: (rows, next_offset, parsed_offset, content_hash). next_offset is where
+               the next chunk starts, or None once the end of the file is reached;
+               then parsed_offset is the end of the last complete section and
+               content_hash the SHA-256 of the file up to it (both None before).
+    """
+    rows = []
+    parsed_offset = start_offset
+    for _, end_offset, task_data in iter_log_sections(file_path, start_offset=start_offset):
+        rows.append(build_response_row(group_name, session_name, task_data, ingested_at))
+        parsed_offset = end_offset
+        if len(rows) >= max_rows:
+            return rows, end_offset, None, None
+    return rows, None, parsed_offset, _hash_file_prefix(file_path, parsed_offset)
+
+
+def _manifest_entry(file_info, parsed_offset, content_hash, ingested_at):
+    return (os.path.abspath(file_info['file_path']), file_info['group_name'], file_info['session_name'],
+            file_info['size_bytes'], file_info['mtime'], content_hash, parsed_offset, ingested_at)
+
+
+def _ingest_serial(writer, files, ingested_at):
+    for file_info in files:
+        start_offset = file_info['start_offset']
+        while start_offset is not None:
+            rows, start_offset, parsed_offset, content_hash = parse_session_chunk(
+                file_info['group_name'], file_info['session_name'], file_info['file_path'], ingested_at,
+                start_offset=start_offset, max_rows=writer.batch_size)
+            manifest_entry = _manifest_entry(file_info, parsed_offset, content_hash, ingested_at) if start_offset is None else None
+            writer.write_rows(file_info['group_name'], file_info['file_path'], rows, manifest_entry)
+
+
+def _ingest_parallel(writer, files, ingested_at, workers, queue_size):
+    """
+    Parses files in a process pool and feeds the rows to one writer thread through
+    a bounded queue. Files are split into chunks of writer.batch_size sections, so
+    memory stays bounded however large a single log is.
+    """
+    row_queue = queue.Queue(maxsize=queue_size)
+    writer_errors = []
+
+    def writer_loop():
+        try:
+            while True:
+                item = row_queue.get()
+                if item is None:
+                    break
+                writer.write_rows(*item)
+            writer.commit()
+        except Exception as e:
+            writer_errors.append(e)
+            # Keep draining so the producer never blocks on a dead consumer.
+            while row_queue.get() is not None:
+                pass
+
+    writer_thread = threading.Thread(target=writer_loop, name="ingest-writer")
+    writer_thread.start()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            remaining_files = iter(files)
+            pending = {}
+
+            def submit(file_info, start_offset):
+                future = pool.submit(parse_session_chunk, file_info['group_name'], file_info['session_name'],
+                                     file_info['file_path'], ingested_at, start_offset, writer.batch_size)
+                pending[future] = file_info
+
+            # Keep a couple of chunks per worker in flight; results wait in the bounded queue.
+            for file_info in itertools.islice(remaining_files, workers * 2):
+                submit(file_info, file_info['start_offset'])
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    file_info = pending.pop(future)
+                    rows, next_offset, parsed_offset, content_hash = future.result()
+                    if next_offset is not None:
+                        row_queue.put((file_info['group_name'], file_info['file_path'], rows, None))
+                        submit(file_info, next_offset)
+                    else:
+                        row_queue.put((file_info['group_name'], file_info['file_path'], rows,
+                                       _manifest_entry(file_info, parsed_offset, content_hash, ingested_at)))
+                        for next_file in itertools.islice(remaining_files, 1):
+                            submit(next_file, next_file['start_offset'])
+    finally:
+        row_queue.put(None)
+        writer_thread.join()
+    if writer_errors:
+        raise writer_errors[0]
+
+
+def ingest_log_files(db_file, master_folder, batch_size=DEFAULT_BATCH_SIZE, workers=1, queue_size=8,
+                     full_rescan=False):
+    """
+    Walks the data folder, parses all .txt files, and ingests them into the DB.
+
+    Rows are inserted with executemany() in transactions of batch_size rows,
+    under the 'bulk_ingest' pragma profile of db_utils (WAL, synchronous=NORMAL).
+
+    With workers > 1, files are parsed and hashed by a pool of worker processes
+    and a single writer thread inserts the results, receiving them through a
+    queue of at most queue_size chunks. The database only ever has one writer.
+
+    Ingestion is incremental: the ingest_manifest table records how far each file
+    was parsed, so unchanged files are skipped and growing ones are read from
+    their last complete section (see plan_ingestion). full_rescan=True re-reads
+    everything.
+
+    Returns:
+        dict: Total 'inserted' and 'ignored' (duplicate) counts, plus the same
+              counts 'per_group' and 'per_file', and the numbers of
+              'skipped_files' and 'tailed_files'. Both paths report identical counts.
+    """
+    logging.info(f"--- Starting Data Ingestion from '{master_folder}' ---")
+    conn = create_connection(db_file, profile="bulk_ingest")
+    if not conn:
+        logging.error("Could not create database connection. Aborting ingestion.")
+        return
+    # Creates the tables on a fresh database and adds any newer columns to an old one.
+    create_db_tables(conn)
+    files, skipped, tailed = plan_ingestion(conn, master_folder, full_rescan=full_rescan)
+    logging.info(f"{len(files)} files to read ({tailed} resumed from their last section), {skipped} unchanged files skipped.")
+    # The parallel writer runs on its own thread; sqlite3 connections are bound to
+    # their creating thread unless told otherwise.
+    if workers > 1:
+        conn.close()
+        conn = create_connection(db_file, check_same_thread=False, profile="bulk_ingest")
+
+    # One timestamp for the whole run: every row of a run is ingested "together".
+    ingested_at = datetime.now().isoformat()
+    writer = IngestWriter(conn, batch_size=batch_size)
+    writer.report['skipped_files'] = skipped
+    writer.report['tailed_files'] = tailed
+    try:
+        if workers > 1:
+            _ingest_parallel(writer, files, ingested_at, workers, queue_size)
+        else:
+            _ingest_serial(writer, files, ingested_at)
+            writer.commit()
+    except sqlite3.Error as e:
+        conn.rollback()
+        logging.error(f"Ingestion aborted by a database error: {e}. Rows committed before it are kept.")
+    finally:
+        conn.close()
+
+    report = writer.report
     logging.info("--- Data Ingestion Complete ---")
-    logging.info(f"Summary: {newly_inserted_count} new records inserted, {ignored_count} records ignored as duplicates.")
+    for group_name, counts in sorted(report['per_group'].items()):
+        logging.info(f"  - {group_name}: {counts['inserted']} inserted, {counts['ignored']} ignored.")
+    logging.info(f"Summary: {report['inserted']} new records inserted, {report['ignored']} records ignored as duplicates.")
+    return report
 
 
 if __name__ == '__main__':
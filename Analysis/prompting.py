@@ -1,92 +1,77 @@
 import os
+import re
 import sys
 import json
+import time
 import argparse
+import hashlib
 from datetime import datetime
-import google.generativeai as genai
-import openai
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-# --- API-Specific Functions ---
+from providers import (get_provider, register_provider, register_openai_compatible_endpoint, summarize_telemetry,
+                       ProviderConfigError, ReplayProvider)
+from rate_limiting import get_rate_limiter, configure_rate_limit, estimate_tokens
+from response_cache import ResponseCache, make_cache_key
+from automata_context import prune_automata_context
+from db_utils import create_connection, create_db_tables
+from ingest_data import build_response_row, insert_response_rows, normalize_log_value
+from hedging import hedged_call, get_latency_histogram, hedge_stats, DEFAULT_REQUEST_TIMEOUT
 
-# --- Gemini Functions ---
+# --- Provider Dispatch ---
+# Providers (Gemini, OpenAI, OpenAI-compatible endpoints, ...) live in providers.py.
+# A model name is resolved by an explicit '<provider>:<model>' prefix, or by pattern.
 
-def setup_gemini(api_key):
-    """Configures the Gemini API."""
-    try:
-        genai.configure(api_key=api_key)
-        return True
-    except Exception as e:
-        print(f"Error configuring Gemini: {e}")
-        return False
-
-def prompt_gemini_model(model_name, full_prompt):
+def prompt_model(model_name, full_prompt, timeout=None, stream=False):
     """
-    Sends a prompt to a specified Gemini model and returns the response text.
+    Sends a prompt to the provider that serves model_name and returns the response
+    text with the call's telemetry. The latency of every successful call is
+    recorded in the model's latency histogram.
 
     Args:
-        model_name (str): The name of the Gemini model to use.
+        model_name (str): The model to use (e.g., 'gpt-4.1', 'local:llama-3-8b').
         full_prompt (str): The complete prompt to send to the model.
+        timeout (float, optional): Seconds to wait before the request times out.
+        stream (bool): Stream the response, which also measures time to first token.
 
     Returns:
-        str: The text content of the model's response.
-    """
-    try:
-        model = genai.GenerativeModel(model_name)
-        response = model.generate_content(full_prompt)
-        print(f"  -> Success: Received response from model.")
-        return response.text
-    except Exception as e:
-        print(f"  -> ERROR: An error occurred during Gemini API call: {e}")
-        return json.dumps({"error": str(e)})
-
-# --- OpenAI Functions (Updated for openai>=1.0.0) ---
+        tuple: (response text, telemetry dict with latency, TTFT, token counts and finish reason)
 
-def setup_openai(api_key):
+    Raises:
+        Exception: Any API error is propagated so the caller can retry or record it.
     """
-    Configures and returns an OpenAI client instance.
-    
-    Returns:
-        openai.OpenAI: An instance of the OpenAI client, or None on failure.
-    """
-    try:
-        client = openai.OpenAI(api_key=api_key)
-        # A simple check to see if the client is configured correctly.
-        client.models.list() 
-        return client
-    except Exception as e:
-        print(f"Error configuring OpenAI client: {e}")
-        return None
+    provider, provider_model = get_provider(model_name)
+    response_text, telemetry = provider.generate_with_telemetry(provider_model, full_prompt, timeout=timeout, stream=stream)
+    get_latency_histogram(model_name).record(telemetry['latency_s'])
+    telemetry = {"provider": provider.name, "model": model_name, **telemetry}
+    print(f"  -> Success: Received response from model.")
+    return response_text, telemetry
 
-def prompt_openai_model(client, model_name, full_prompt):
-    """
-    Sends a prompt to a specified OpenAI model using the new client syntax.
+# --- Generic Workflow Functions ---
 
-    Args:
-        client (openai.OpenAI): The configured OpenAI client instance.
-        model_name (str): The name of the OpenAI model to use (e.g., 'gpt-4.1').
-        full_prompt (str): The complete prompt to send to the model.
+def format_prompt(preamble, task_input, task_context, compact=False):
+    """
+    Formats the final prompt string to be sent to the model.
 
-    Returns:
-        str: The text content of the model's response.
+    With compact=True the context is serialised as minified JSON and placed before
+    the task input. Every prompt then starts with the byte-identical preamble, and
+    consecutive tasks sharing a context share an even longer prefix, so provider
+    prompt caching can apply; the indentation of the default layout is also a
+    large share of the input tokens for big contexts.
     """
-    try:
-        response = client.chat.completions.create(
-            model=model_name,
-            messages=[
-                {"role": "user", "content": full_prompt}
-            ]
-        )
-        print(f"  -> Success: Received response from model.")
-        return response.choices[0].message.content
-    except Exception as e:
-        print(f"  -> ERROR: An error occurred during OpenAI API call: {e}")
-        return json.dumps({"error": str(e)})
+    if compact:
+        context_str = json.dumps(task_context, separators=(',', ':'), ensure_ascii=False)
+        return f"""{preamble}
 
+### Relevant context
+```json
+{context_str}
+```
 
-# --- Generic Workflow Functions ---
+### User input to fulfil
+{task_input}
+"""
 
-def format_prompt(preamble, task_input, task_context):
-    """Formats the final prompt string to be sent to the model."""
     context_str = json.dumps(task_context, indent=2)
     
     return f"""{preamble}
@@ -100,105 +85,633 @@ def format_prompt(preamble, task_input, task_context):
 ```
 """
 
-def format_log_entry(task_type, task_input, task_context, model_response_text):
-    """Formats a single entry for the output log file."""
+def make_task_key(task_type, task_index=None):
+    """
+    Builds the task_key of a result: the task type and the current time, plus the
+    task index when given, so entries written out of order by a concurrent session
+    can be sorted back into task order and never share a task_key within the same second.
+    """
     timestamp = datetime.now().strftime('%Y-%m-%d-%H-%M-%S')
-    header = f"[{task_type}-{timestamp}]"
+    if task_index is None:
+        return f"{task_type}-{timestamp}"
+    return f"{task_type}-{timestamp}-{task_index:05d}"
+
+def format_log_entry(task_type, task_input, task_context, model_response_text, task_index=None, telemetry=None,
+                     task_key=None):
+    """
+    Formats a single entry for the output log file.
+
+    The section header is the task_key (see make_task_key), built here unless
+    given. Telemetry, if given, is written as a single-line JSON 'telemetry::'
+    field after the response.
+    """
+    header = f"[{task_key or make_task_key(task_type, task_index)}]"
     context_str = json.dumps(task_context)
     response_str = model_response_text
+    telemetry_line = f"telemetry::{json.dumps(telemetry)}\n" if telemetry else ""
     
     return f"""{header}
 input::{task_input}
 context::{context_str}
 response::{response_str}
----END_SECTION---
+{telemetry_line}---END_SECTION---
 """
 
-def run_prompting_session(task_type, model_name, prompt_preamble, input_json_file, output_log_dir):
+# --- Checkpoint Functions ---
+
+def get_manifest_path(log_filepath):
+    """Returns the path of the checkpoint manifest that accompanies a session log."""
+    return log_filepath + ".manifest.jsonl"
+
+def _sha256_of(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def append_manifest_record(manifest_file, record):
+    """Appends one JSON record to an open manifest file and flushes it to disk."""
+    manifest_file.write(json.dumps(record) + "\n")
+    manifest_file.flush()
+    os.fsync(manifest_file.fileno())
+
+def load_checkpoint_manifest(manifest_path):
     """
-    Reads tasks from a JSON file, prompts a specified model via its API, 
-    and writes the results to a structured log file.
+    Reads a checkpoint manifest written by run_prompting_session.
+
+    The first line holds the session metadata; every following line records the
+    outcome of one task. A truncated final line (from a crash mid-write) is ignored.
+
+    Args:
+        manifest_path (str): Path to the '.manifest.jsonl' file.
+
+    Returns:
+        tuple: (session_metadata dict, {task_index: latest task record dict})
     """
-    print("--- Starting New Prompting Session ---")
-    print(f"  Task Type: {task_type}")
-    print(f"  Model: {model_name}")
-    print(f"  Input File: {input_json_file}")
-    print("------------------------------------")
+    session_metadata = None
+    task_states = {}
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"  -> WARNING: Ignoring a truncated line in '{manifest_path}'.")
+                continue
+            if session_metadata is None:
+                session_metadata = record
+            else:
+                task_states[record['index']] = record
+    return session_metadata, task_states
+
+# --- Database Sink ---
+
+TASK_INDEX_PATTERN = re.compile(r"-(\d{5,})$")
+
+class DatabaseSink:
+    """
+    Writes a session's results straight into the 'responses' table as they arrive.
+
+    Rows are identical to what ingest_log_files would produce from the session log
+    (same task_key, problem_hash and normalised values), so a mirrored log can
+    still be ingested later without creating duplicates. Rows are committed every
+    commit_every results or commit_interval seconds, whichever comes first, so
+    judging can start on them while the session is still running. One sink (one
+    connection) is shared by every model of a session, so it is the only writer.
+    """
+
+    def __init__(self, db_file, commit_every=20, commit_interval=2.0):
+        self.db_file = db_file
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self.conn = create_connection(db_file, profile="bulk_ingest")
+        if not self.conn:
+            sys.exit(f"Could not open the database '{db_file}'.")
+        create_db_tables(self.conn)
+        self.uncommitted = 0
+        self.last_commit = time.monotonic()
+
+    def completed_task_indexes(self, group_name, session_name, task_type):
+        """Returns the task indexes of a group/session already in the database."""
+        rows = self.conn.execute(
+            "SELECT task_key FROM responses WHERE group_name = ? AND session_name = ? AND task_key LIKE ?;",
+            (group_name, session_name, f"{task_type}-%")
+        ).fetchall()
+        return {int(match.group(1)) for (task_key,) in rows if (match := TASK_INDEX_PATTERN.search(task_key))}
+
+    def record_success(self, group_name, session_name, task_key, task, response_text, telemetry=None):
+        task_data = {
+            'task_key': task_key,
+            'input': normalize_log_value(task['input']),
+            'context': normalize_log_value(json.dumps(task['context'])),
+            'response': normalize_log_value(response_text),
+            'telemetry': json.dumps(telemetry) if telemetry else None,
+        }
+        insert_response_rows(self.conn, [build_response_row(group_name, session_name, task_data, datetime.now().isoformat())])
+        self.uncommitted += 1
+        if self.uncommitted >= self.commit_every or time.monotonic() - self.last_commit >= self.commit_interval:
+            self.commit()
+
+    def commit(self):
+        self.conn.commit()
+        self.uncommitted = 0
+        self.last_commit = time.monotonic()
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+
+class SessionLog:
+    """
+    The output of one model in a prompting session: a log file plus its checkpoint
+    manifest, and/or rows written straight to the database by a DatabaseSink.
+
+    Every completed task is recorded in the manifest with its byte offset and length
+    in the log. The log entry is always flushed before its manifest record, so the
+    manifest never points past the end of the log. Only the session's main thread
+    writes to it, so no locking is needed.
+
+    With a db_sink, results also go to the 'responses' table, in group
+    '<model>' (or '<model>-<db_group_label>') and session db_session_name (default
+    'Session-<timestamp>', the name the notebook gives the log). With write_log=False
+    no log is written; a session is then resumed by passing the same
+    db_session_name, and the tasks already in the database are skipped.
+    """
+
+    def __init__(self, task_type, model_name, session_metadata, output_log_dir, resume_log=None,
+                 write_log=True, db_sink=None, db_group_label=None, db_session_name=None):
+        self.task_type = task_type
+        self.model_name = model_name
+        self.completed_tasks = set()
+        self.failed_tasks = {}
+        self.telemetry = []
+        self.rows_written = 0
+        self.log_filepath = None
+        self.db_sink = db_sink
+        session_metadata = dict(session_metadata)
+        session_timestamp = datetime.now().strftime('%Y-%m-%d-%H-%M-%S')
+        safe_model_name = model_name.replace("/", "_").replace(":", "_")
+
+        saved_metadata = {}
+        if resume_log:
+            self.log_filepath = resume_log
+            self.manifest_path = get_manifest_path(resume_log)
+            saved_metadata = self._load_checkpoint(session_metadata)
+            print(f"[{model_name}] Resuming session: {len(self.completed_tasks)}/{session_metadata['task_count']} tasks already completed.")
+            print(f"[{model_name}] Will append results to: {self.log_filepath}")
+        elif write_log:
+            os.makedirs(output_log_dir, exist_ok=True)
+            log_filename = f"LatentSpaceLog-{safe_model_name}-{session_timestamp}.txt"
+            self.log_filepath = os.path.join(output_log_dir, log_filename)
+            self.manifest_path = get_manifest_path(self.log_filepath)
+            print(f"[{model_name}] Will write results to: {self.log_filepath}")
+
+        if db_sink:
+            # A resumed log keeps writing to the group/session it started with.
+            self.db_group_name = saved_metadata.get('db_group_name') or (
+                f"{safe_model_name}-{db_group_label}" if db_group_label else safe_model_name)
+            self.db_session_name = db_session_name or saved_metadata.get('db_session_name') or f"Session-{session_timestamp}"
+            session_metadata.update(db_group_name=self.db_group_name, db_session_name=self.db_session_name)
+            if not self.log_filepath:
+                self.completed_tasks = db_sink.completed_task_indexes(self.db_group_name, self.db_session_name, task_type)
+                if self.completed_tasks:
+                    print(f"[{model_name}] Resuming session: {len(self.completed_tasks)}/{session_metadata['task_count']} tasks already in the database.")
+            print(f"[{model_name}] Will write rows to '{db_sink.db_file}' as group '{self.db_group_name}', session '{self.db_session_name}'.")
+
+        if self.log_filepath:
+            self.log_file = open(self.log_filepath, 'ab' if resume_log else 'wb')
+            self.manifest_file = open(self.manifest_path, 'a' if resume_log else 'w', encoding='utf-8')
+            if not resume_log:
+                append_manifest_record(self.manifest_file, session_metadata)
+            self.log_offset = self.log_file.tell()
 
-    # 1. Load input data
+    def _load_checkpoint(self, session_metadata):
+        """
+        Validates the manifest against this session and truncates any unrecorded
+        tail of the log. Returns the saved session metadata.
+        """
+        if not os.path.exists(self.log_filepath) or not os.path.exists(self.manifest_path):
+            sys.exit(f"Cannot resume: '{self.log_filepath}' or its manifest '{self.manifest_path}' does not exist.")
+        saved_metadata, task_states = load_checkpoint_manifest(self.manifest_path)
+        # Manifests written before the prompt layout flags were recorded used the defaults.
+        saved_metadata = {"compact_prompts": False, "prune_context": False, **saved_metadata}
+        for key in ("task_type", "model_name", "input_sha256", "preamble_sha256", "task_count",
+                    "compact_prompts", "prune_context"):
+            if saved_metadata.get(key) != session_metadata[key]:
+                sys.exit(f"Cannot resume: '{key}' does not match the checkpointed session.")
+
+        # Only trust entries that are fully on disk, then cut off anything written
+        # after the last checkpoint (e.g. a half-written entry from a crash).
+        log_size = os.path.getsize(self.log_filepath)
+        valid_end = 0
+        for index, state in task_states.items():
+            if state['status'] == 'done' and state['offset'] + state['length'] <= log_size:
+                self.completed_tasks.add(index)
+                valid_end = max(valid_end, state['offset'] + state['length'])
+        with open(self.log_filepath, 'r+b') as f:
+            f.truncate(valid_end)
+        return saved_metadata
+
+    def record_success(self, task_index, task, response_text, telemetry=None):
+        """Writes a task's log entry and checkpoints it, and/or writes its database row."""
+        task_key = make_task_key(self.task_type, task_index)
+        if self.log_filepath:
+            log_entry = format_log_entry(self.task_type, task['input'], task['context'], response_text,
+                                         telemetry=telemetry, task_key=task_key)
+            entry_bytes = (log_entry + "\n").encode('utf-8')
+            self.log_file.write(entry_bytes)
+            self.log_file.flush()
+            append_manifest_record(self.manifest_file, {"index": task_index, "status": "done", "offset": self.log_offset, "length": len(entry_bytes)})
+            self.log_offset += len(entry_bytes)
+        if self.db_sink:
+            self.db_sink.record_success(self.db_group_name, self.db_session_name, task_key, task, response_text, telemetry)
+            self.rows_written += 1
+        self.completed_tasks.add(task_index)
+        self.telemetry.append(telemetry)
+
+    def record_failure(self, task_index, error):
+        """Checkpoints a failed task. Nothing is written to the log or the database."""
+        self.failed_tasks[task_index] = error
+        if self.log_filepath:
+            append_manifest_record(self.manifest_file, {"index": task_index, "status": "failed", "error": str(error)})
+
+    def close(self):
+        if self.log_filepath:
+            self.log_file.close()
+            self.manifest_file.close()
+
+
+def load_tasks(input_json_file):
+    """Loads the task list from a JSON file, exiting with a message if it cannot be read."""
     try:
         with open(input_json_file, 'r') as f:
             tasks = json.load(f)
         print(f"Successfully loaded {len(tasks)} tasks from '{input_json_file}'.")
+        return tasks
     except (FileNotFoundError, json.JSONDecodeError) as e:
         sys.exit(f"Error reading input file: {e}")
 
-    # 2. Prepare output log file
-    os.makedirs(output_log_dir, exist_ok=True)
-    session_timestamp = datetime.now().strftime('%Y-%m-%d-%H-%M-%S')
-    safe_model_name = model_name.replace("/", "_")
-    log_filename = f"LatentSpaceLog-{safe_model_name}-{session_timestamp}.txt"
-    log_filepath = os.path.join(output_log_dir, log_filename)
-    print(f"Will write results to: {log_filepath}\n")
-    
-    # 3. Setup APIs based on model type
-    api_client = None
-    if 'gemini' in model_name.lower():
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key or not setup_gemini(api_key):
-            sys.exit("Failed to configure Gemini API. Is GEMINI_API_KEY set?")
-    elif 'gpt' in model_name.lower():
-        api_key = os.getenv("OPENAI_API_KEY")
-        api_client = setup_openai(api_key) # This now returns a client object
-        if not api_client:
-            sys.exit("Failed to configure OpenAI API. Is OPENAI_API_KEY set and valid?")
-    else:
-        sys.exit(f"Unknown model provider for '{model_name}'. Cannot determine which API key to use.")
-
-    # 4. Process each task and write to log immediately
-    with open(log_filepath, 'w', encoding='utf-8') as log_file:
-        for i, task in enumerate(tasks):
-            print(f"Processing task {i+1}/{len(tasks)}...")
-            full_prompt = format_prompt(prompt_preamble, task['input'], task['context'])
-            
-            # --- Model Dispatcher ---
-            response_text = ""
-            if 'gemini' in model_name.lower():
-                response_text = prompt_gemini_model(model_name, full_prompt)
-            elif 'gpt' in model_name.lower() and api_client:
-                response_text = prompt_openai_model(api_client, model_name, full_prompt)
-            else:
-                print(f"  -> ERROR: Unknown or unconfigured model provider for '{model_name}'. Skipping.")
-                response_text = json.dumps({"error": f"Unknown or unconfigured model provider for '{model_name}'"})
+def _run_sessions(task_type, model_names, prompt_preamble, input_json_file, output_log_dir,
+                  concurrency=None, cache_file=None, resume_logs=None,
+                  request_timeout=DEFAULT_REQUEST_TIMEOUT, hedge_percentile=None, stream=False,
+                  compact_prompts=False, prune_context=False, write_log=True, db_file=None,
+                  db_group_label=None, db_session_name=None):
+    """
+    The shared prompting engine behind run_prompting_session and run_fanout_session.
+
+    Loads and formats every task once, then dispatches each task to every model in
+    model_names. Each model gets its own SessionLog, and its own thread pool and
+    rate limiter bounding it to `concurrency` requests in flight (default: the
+    provider's default_concurrency, e.g. higher for a local batching server), so a
+    slow or throttled model never holds back the others.
+
+    Every request times out after request_timeout seconds (and is retried). If
+    hedge_percentile is set (e.g. 0.95), a request still running after that
+    percentile of the model's observed latency is duplicated, and whichever copy
+    answers first is used.
+
+    The telemetry of every call (latency, token counts, finish reason and, with
+    stream=True, time to first token) is written next to its response in the log.
+    compact_prompts selects the cache-friendly layout of format_prompt. With
+    prune_context, automataScripting contexts are reduced to the materials relevant
+    to each task (see automata_context.py), and other task types are sent as is;
+    the log records the pruned context that was actually sent.
+
+    With db_file, each result is also written straight to the database as it
+    arrives (see DatabaseSink); write_log=False then skips the text log entirely.
+
+    Returns:
+        dict: model name -> SessionLog (already closed).
+    """
+    if concurrency is not None and concurrency < 1:
+        sys.exit(f"Concurrency must be at least 1, got {concurrency}.")
+    if not write_log and not db_file:
+        sys.exit("write_log=False (--no_log) requires db_file, otherwise results would not be saved anywhere.")
+    resume_logs = resume_logs or {}
+
+    # 1. Load input data and build every prompt once; prompts do not depend on the model.
+    tasks = load_tasks(input_json_file)
+    input_sha256 = _sha256_of(json.dumps(tasks, sort_keys=True))
+    if prune_context and task_type == 'automataScripting':
+        # Other task types use different context shapes and are sent unchanged.
+        tasks = [dict(task, context=prune_automata_context(task['context'], task['input']))
+                 if isinstance(task['context'], dict) else task for task in tasks]
+    prompts = [format_prompt(prompt_preamble, task['input'], task['context'], compact=compact_prompts) for task in tasks]
+    preamble_sha256 = _sha256_of(prompt_preamble)
+
+    # 2. Resolve each model's provider (credentials are only checked locally)
+    providers = {}
+    for model_name in model_names:
+        try:
+            provider, _ = get_provider(model_name)
+            provider.setup()
+        except ProviderConfigError as e:
+            sys.exit(f"Failed to configure a provider for '{model_name}': {e}")
+        providers[model_name] = provider
+    model_concurrency = {m: concurrency or providers[m].default_concurrency for m in model_names}
+    if concurrency is None:
+        print(f"  Concurrency (provider defaults): {', '.join(f'{m}: {n}' for m, n in model_concurrency.items())}")
+    limiters = {m: get_rate_limiter(providers[m].name, m, max_concurrency=model_concurrency[m]) for m in model_names}
+    cache = ResponseCache(cache_file) if cache_file else None
+
+    # 3. Prepare one output log per model (a new one, or the one being resumed)
+    db_sink = DatabaseSink(db_file) if db_file else None
+    session_logs = {}
+    for model_name in model_names:
+        session_metadata = {
+            "task_type": task_type,
+            "model_name": model_name,
+            "input_json_file": input_json_file,
+            "input_sha256": input_sha256,
+            "preamble_sha256": preamble_sha256,
+            "task_count": len(tasks),
+            "compact_prompts": compact_prompts,
+            "prune_context": prune_context,
+        }
+        session_logs[model_name] = SessionLog(task_type, model_name, session_metadata, output_log_dir,
+                                              resume_log=resume_logs.get(model_name), write_log=write_log,
+                                              db_sink=db_sink, db_group_label=db_group_label,
+                                              db_session_name=db_session_name)
+    print()
+
+    def call_model(model_name, full_prompt):
+        # Each hedged attempt goes through the rate limiter separately.
+        return hedged_call(limiters[model_name].call, prompt_model, model_name, full_prompt,
+                           timeout=request_timeout, stream=stream, estimated_tokens=estimate_tokens(full_prompt),
+                           histogram=get_latency_histogram(model_name), hedge_percentile=hedge_percentile)
+
+    def run_task(model_name, task_index):
+        full_prompt = prompts[task_index]
+        if not cache:
+            return call_model(model_name, full_prompt)
+        # Only the response text is cached; a hit is marked as such in the telemetry.
+        cache_key = make_cache_key(providers[model_name].name, model_name, {}, full_prompt)
+        telemetry = {"provider": providers[model_name].name, "model": model_name, "cache_hit": True}
+
+        def call_uncached():
+            nonlocal telemetry
+            response_text, telemetry = call_model(model_name, full_prompt)
+            return response_text
+
+        response_text = cache.get_or_call(cache_key, call_uncached)
+        return response_text, telemetry
+
+    # 4. Process tasks concurrently and write each entry to its log as it completes.
+    #    Tasks are interleaved across models so every model makes progress together.
+    work = [(model_name, i) for i in range(len(tasks)) for model_name in model_names
+            if i not in session_logs[model_name].completed_tasks]
+    total = len(tasks) * len(model_names)
+    completed = total - len(work)
+    try:
+        # One pool per model, so threads waiting on one throttled model's limiter
+        # never take the slots another model could be using.
+        with ExitStack() as stack:
+            executors = {m: stack.enter_context(ThreadPoolExecutor(max_workers=model_concurrency[m],
+                                                                   thread_name_prefix=f"prompt-{i}"))
+                         for i, m in enumerate(model_names)}
+            futures = {executors[model_name].submit(run_task, model_name, i): (model_name, i) for model_name, i in work}
+            for future in as_completed(futures):
+                model_name, i = futures[future]
+                session_log = session_logs[model_name]
+                completed += 1
+                try:
+                    response_text, telemetry = future.result()
+                except Exception as e:
+                    print(f"  -> ERROR: [{model_name}] Task {i+1} failed ({type(e).__name__}): {e}")
+                    session_log.record_failure(i, e)
+                    continue
+                print(f"Completed [{model_name}] task {i+1} ({completed}/{total}).")
+                session_log.record_success(i, tasks[i], response_text, telemetry=telemetry)
+    finally:
+        for session_log in session_logs.values():
+            session_log.close()
+        if db_sink:
+            db_sink.close()
 
-            # Format and write the log entry
-            log_entry = format_log_entry(task_type, task['input'], task['context'], response_text)
-            log_file.write(log_entry + "\n")
-    
     print("\n--- Prompting Session Complete ---")
-    print(f"All {len(tasks)} tasks have been processed and logged to {log_filepath}.")
+    for model_name, session_log in session_logs.items():
+        failed_tasks = session_log.failed_tasks
+        if session_log.log_filepath:
+            print(f"[{model_name}] {len(tasks) - len(failed_tasks)}/{len(tasks)} tasks have been processed and logged to {session_log.log_filepath}.")
+        if db_sink:
+            print(f"[{model_name}] {session_log.rows_written} rows written to '{db_file}' (group '{session_log.db_group_name}', session '{session_log.db_session_name}').")
+        if failed_tasks:
+            print(f"[{model_name}] {len(failed_tasks)} tasks failed and were not logged (task indexes: {sorted(failed_tasks)}).")
+            if session_log.log_filepath:
+                print(f"[{model_name}] Re-run with resume_log='{session_log.log_filepath}' to retry only the failed tasks.")
+            else:
+                print(f"[{model_name}] Re-run with db_session_name='{session_log.db_session_name}' to retry only the failed tasks.")
+        print(f"[{model_name}] Rate limiter stats: {limiters[model_name].stats}")
+        print(f"[{model_name}] Latency (s): {get_latency_histogram(model_name).summary()}")
+        print(f"[{model_name}] Telemetry: {summarize_telemetry(session_log.telemetry)}")
+    if hedge_percentile is not None:
+        print(f"Hedging stats: {hedge_stats}")
+    if cache:
+        print(f"Response cache stats: {cache.stats}")
+        cache.close()
+    return session_logs
+
+def run_prompting_session(task_type, model_name, prompt_preamble, input_json_file, output_log_dir, concurrency=None,
+                          cache_file=None, resume_log=None, request_timeout=DEFAULT_REQUEST_TIMEOUT,
+                          hedge_percentile=None, stream=False, compact_prompts=False,
+                          prune_context=False, write_log=True, db_file=None, db_group_label=None,
+                          db_session_name=None):
+    """
+    Reads tasks from a JSON file, prompts a specified model via its API, 
+    and writes the results to a structured log file.
+
+    Up to `concurrency` requests are kept in flight at once using a thread pool;
+    by default, the provider's default_concurrency.
+    Each log entry is written as soon as its request completes, so entries may
+    appear out of order; the task index is recorded in each section header.
+
+    Calls go through the shared per-model rate limiter, which retries throttled
+    and transient failures. Tasks that still fail are reported at the end and
+    are NOT written to the log, so an error is never mistaken for a response.
+
+    If cache_file is given, responses are read through a persistent on-disk cache
+    keyed on the provider, model and full prompt, so re-running an identical
+    session costs no API calls.
+
+    Every completed task is recorded in a checkpoint manifest next to the log,
+    with its byte offset and length in the log. Passing the path of an existing
+    log as resume_log skips the tasks already completed and appends the rest to
+    that same log, so a crashed session only pays for the remaining work.
+
+    Each request times out after request_timeout seconds. With hedge_percentile
+    (e.g. 0.95), slow requests are duplicated once they exceed that percentile of
+    the model's observed latency, and the first answer wins.
+
+    Every log entry carries a 'telemetry::' line with the call's latency, token
+    counts and finish reason. With stream=True responses are streamed, which
+    also records the time to first token.
+
+    With compact_prompts=True, prompts use minified context JSON and keep the
+    preamble as a byte-identical prefix, so provider-side prompt caching applies.
+    The share of cached input tokens is reported in the session summary.
+
+    prune_context=True (automataScripting only) sends each task just the base
+    materials and those relevant to its input, listing the rest by name.
+
+    With db_file, every result is also inserted into the 'responses' table as it
+    arrives, in group '<model>' (or '<model>-<db_group_label>') and session
+    db_session_name (default 'Session-<timestamp>'), so the usual rename and
+    ingest steps are unnecessary and judging can start while prompting runs.
+    write_log=False then skips the text log; resume such a session by passing
+    the same db_session_name.
+
+    Returns:
+        str: The path of the session log, or None if write_log is False.
+    """
+    print("--- Starting New Prompting Session ---")
+    print(f"  Task Type: {task_type}")
+    print(f"  Model: {model_name}")
+    print(f"  Input File: {input_json_file}")
+    print(f"  Concurrency: {concurrency or 'provider default'}")
+    print("------------------------------------")
+
+    session_logs = _run_sessions(task_type, [model_name], prompt_preamble, input_json_file, output_log_dir,
+                                 concurrency=concurrency, cache_file=cache_file,
+                                 resume_logs={model_name: resume_log} if resume_log else None,
+                                 request_timeout=request_timeout, hedge_percentile=hedge_percentile, stream=stream,
+                                 compact_prompts=compact_prompts, prune_context=prune_context,
+                                 write_log=write_log, db_file=db_file, db_group_label=db_group_label,
+                                 db_session_name=db_session_name)
+    return session_logs[model_name].log_filepath
+
+def run_fanout_session(task_type, model_names, prompt_preamble, input_json_file, output_log_dir, concurrency=None,
+                       cache_file=None, resume_logs=None, request_timeout=DEFAULT_REQUEST_TIMEOUT,
+                       hedge_percentile=None, stream=False, compact_prompts=False,
+                       prune_context=False, write_log=True, db_file=None, db_group_label=None,
+                       db_session_name=None):
+    """
+    Runs one prompting session against several models at once from a single task file.
+
+    The task file is read and every prompt is formatted once, then each task is
+    dispatched to all models concurrently. Each model writes its own log (with its
+    own checkpoint manifest), exactly as run_prompting_session would, so the logs
+    can be reorganised and ingested as usual.
+
+    Args:
+        model_names (list[str]): The models to compare.
+        concurrency (int): Maximum requests in flight per model (default: each
+            provider's default_concurrency).
+        resume_logs (dict, optional): model name -> existing log to resume.
+        request_timeout, hedge_percentile, stream, compact_prompts, prune_context,
+        write_log, db_file, db_group_label, db_session_name: As for run_prompting_session.
+            Each model gets its own database group, so their rows never collide.
+
+    Returns:
+        dict: model name -> path of that model's session log (None if write_log is False).
+    """
+    if len(set(model_names)) != len(model_names):
+        sys.exit("Each model may only appear once in a fan-out session.")
+
+    print("--- Starting New Fan-Out Prompting Session ---")
+    print(f"  Task Type: {task_type}")
+    print(f"  Models: {', '.join(model_names)}")
+    print(f"  Input File: {input_json_file}")
+    print(f"  Concurrency (per model): {concurrency or 'provider default'}")
+    print("------------------------------------")
+
+    session_logs = _run_sessions(task_type, model_names, prompt_preamble, input_json_file, output_log_dir,
+                                 concurrency=concurrency, cache_file=cache_file, resume_logs=resume_logs,
+                                 request_timeout=request_timeout, hedge_percentile=hedge_percentile, stream=stream,
+                                 compact_prompts=compact_prompts, prune_context=prune_context,
+                                 write_log=write_log, db_file=db_file, db_group_label=db_group_label,
+                                 db_session_name=db_session_name)
+    return {model_name: session_log.log_filepath for model_name, session_log in session_logs.items()}
 
 
 if __name__ == '__main__':
-    parser = argparse.ArgumentParser(description="Run a prompting session against a specified LLM.")
+    parser = argparse.ArgumentParser(description="Run a prompting session against one or more LLMs.")
     parser.add_argument("task_type", help="The type of task being run (e.g., 'spellScripting').")
-    parser.add_argument("model_name", help="The model to use (e.g., 'gemini-2.5-flash-preview-05-20', 'gpt-4.1').")
+    parser.add_argument("model_name", help="The model to use (e.g., 'gemini-2.5-flash-preview-05-20', 'gpt-4.1', 'local:llama-3-8b'). Pass a comma-separated list to fan out to several models.")
     parser.add_argument("preamble_file", help="Path to a .txt file containing the prompt preamble.")
     parser.add_argument("input_json", help="Path to the .json file containing the tasks.")
     parser.add_argument("--output_dir", default="session_logs", help="Directory to save the output log file.")
+    parser.add_argument("--concurrency", type=int, default=None, help="Maximum number of requests to keep in flight at once (default: the provider's suggestion).")
+    parser.add_argument("--cache_file", default=None, help="Path to an on-disk response cache (e.g. 'response_cache.db').")
+    parser.add_argument("--base_url", default=None, help="Base URL of an OpenAI-compatible server (e.g. 'http://localhost:8000/v1'), used for 'local:<model>' names.")
+    parser.add_argument("--replay_logs", default=None, help="Serve 'replay:<model>' names from the responses recorded in this session_logs folder.")
+    parser.add_argument("--replay_db", default=None, help="Serve 'replay:<model>' names from the responses stored in this SQLite database.")
+    parser.add_argument("--requests_per_minute", type=float, default=None, help="Your account's request limit for these models (default: the provider default).")
+    parser.add_argument("--tokens_per_minute", type=float, default=None, help="Your account's token limit for these models (default: none, 429s back off instead).")
+    parser.add_argument("--request_timeout", type=float, default=DEFAULT_REQUEST_TIMEOUT, help="Seconds before a single request times out and is retried.")
+    parser.add_argument("--hedge_percentile", type=float, default=None, help="Send a duplicate request once a request exceeds this latency percentile (e.g. 0.95).")
+    parser.add_argument("--stream", action="store_true", help="Stream responses to also record time to first token.")
+    parser.add_argument("--compact_prompts", action="store_true", help="Use minified context JSON and a cache-friendly prompt layout.")
+    parser.add_argument("--prune_context", action="store_true", help="automataScripting only: send just the materials relevant to each task.")
+    parser.add_argument("--db_file", default=None, help="Also write each result straight into this SQLite database (e.g. 'judgements.db').")
+    parser.add_argument("--db_group_label", default=None, help="Database group is '<model>-<label>' (default: just the model name).")
+    parser.add_argument("--db_session_name", default=None, help="Database session name (default 'Session-<timestamp>'); reuse it to resume a --no_log session.")
+    parser.add_argument("--no_log", action="store_true", help="With --db_file: do not write the text log.")
+    parser.add_argument("--resume", default=None, help="Path to an existing session log to resume instead of starting a new one.")
     
     args = parser.parse_args()
 
+    if args.base_url:
+        register_openai_compatible_endpoint(args.base_url, name='local')
+    if args.replay_logs and args.replay_db:
+        sys.exit("Pass either --replay_logs or --replay_db, not both.")
+    try:
+        if args.replay_logs:
+            register_provider(ReplayProvider.from_session_logs(args.replay_logs))
+        elif args.replay_db:
+            register_provider(ReplayProvider.from_database(args.replay_db))
+    except ProviderConfigError as e:
+        sys.exit(f"Cannot replay: {e}")
+
     try:
         with open(args.preamble_file, 'r') as f:
             preamble = f.read()
     except FileNotFoundError:
         sys.exit(f"Error: Preamble file not found at '{args.preamble_file}'")
 
-    run_prompting_session(
-        task_type=args.task_type,
-        model_name=args.model_name,
-        prompt_preamble=preamble,
-        input_json_file=args.input_json,
-        output_log_dir=args.output_dir
-    )
+    model_names = [name.strip() for name in args.model_name.split(",") if name.strip()]
+    rate_limits = {setting: getattr(args, setting) for setting in ('requests_per_minute', 'tokens_per_minute')
+                   if getattr(args, setting) is not None}
+    if rate_limits:
+        for model_name in model_names:
+            try:
+                configure_rate_limit(get_provider(model_name)[0].name, model_name, **rate_limits)
+            except ProviderConfigError as e:
+                sys.exit(f"Failed to configure a provider for '{model_name}': {e}")
+    if len(model_names) > 1:
+        if args.resume:
+            sys.exit("--resume is only supported for single-model sessions; call run_fanout_session(resume_logs=...) instead.")
+        run_fanout_session(
+            task_type=args.task_type,
+            model_names=model_names,
+            prompt_preamble=preamble,
+            input_json_file=args.input_json,
+            output_log_dir=args.output_dir,
+            concurrency=args.concurrency,
+            cache_file=args.cache_file,
+            request_timeout=args.request_timeout,
+            hedge_percentile=args.hedge_percentile,
+            stream=args.stream,
+            compact_prompts=args.compact_prompts,
+            prune_context=args.prune_context,
+            write_log=not args.no_log,
+            db_file=args.db_file,
+            db_group_label=args.db_group_label,
+            db_session_name=args.db_session_name
+        )
+    else:
+        run_prompting_session(
+            task_type=args.task_type,
+            model_name=args.model_name,
+            prompt_preamble=preamble,
+            input_json_file=args.input_json,
+            output_log_dir=args.output_dir,
+            concurrency=args.concurrency,
+            cache_file=args.cache_file,
+            resume_log=args.resume,
+            request_timeout=args.request_timeout,
+            hedge_percentile=args.hedge_percentile,
+            stream=args.stream,
+            compact_prompts=args.compact_prompts,
+            prune_context=args.prune_context,
+            write_log=not args.no_log,
+            db_file=args.db_file,
+            db_group_label=args.db_group_label,
+            db_session_name=args.db_session_name
+        )
@@ -0,0 +1,659 @@
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import logging
+import threading
+
+from rate_limiting import estimate_tokens
+
+# Configure basic logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class ProviderConfigError(RuntimeError):
+    """Raised when a provider cannot be configured, e.g. because its API key is missing."""
+
+
+# --- SDK Imports ---
+# The vendor SDKs are imported on first use, so offline providers (mock, replay,
+# local endpoints) work on machines without google-generativeai or openai installed.
+
+def _import_genai():
+    try:
+        import google.generativeai as genai
+    except ImportError as e:
+        raise ProviderConfigError("The 'google-generativeai' package is required for Gemini models.") from e
+    return genai
+
+def _import_openai():
+    try:
+        import openai
+    except ImportError as e:
+        raise ProviderConfigError("The 'openai' package is required for OpenAI-compatible models.") from e
+    return openai
+
+
+# --- Client Registry ---
+# Clients and model objects are created once per process and shared by every
+# caller and thread, so HTTP connection pools stay warm between requests.
+# Credentials are only read on first use; a bad key surfaces as an error on the
+# first real request instead of costing an extra round trip at startup.
+
+_registry_lock = threading.Lock()
+_openai_clients = {}
+_gemini_models = {}
+_gemini_configured_key = None
+
+def _require_env(var_name):
+    value = os.getenv(var_name)
+    if not value:
+        raise ProviderConfigError(f"The '{var_name}' environment variable is not set.")
+    return value
+
+def get_openai_client(api_key=None, base_url=None):
+    """
+    Returns a shared OpenAI client, creating it on first use.
+
+    Args:
+        api_key (str, optional): Defaults to the OPENAI_API_KEY environment variable.
+        base_url (str, optional): Base URL of the API; defaults to the official endpoint.
+
+    Returns:
+        openai.OpenAI: A client whose connection pool is reused across calls and threads.
+    """
+    if api_key is None:
+        api_key = _require_env("OPENAI_API_KEY")
+    key = (api_key, base_url)
+    with _registry_lock:
+        client = _openai_clients.get(key)
+        if client is None:
+            # Retries are handled by the shared rate limiter, not by the SDK.
+            client = _import_openai().OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+            _openai_clients[key] = client
+            logging.info(f"Created OpenAI client{' for ' + base_url if base_url else ''}.")
+        return client
+
+def _configure_gemini(api_key=None):
+    """Configures the Gemini SDK once per API key. Caller holds the registry lock."""
+    global _gemini_configured_key
+    if api_key is None:
+        api_key = _require_env("GEMINI_API_KEY")
+    if api_key != _gemini_configured_key:
+        _import_genai().configure(api_key=api_key)
+        _gemini_configured_key = api_key
+        _gemini_models.clear()
+
+def get_gemini_model(model_name, api_key=None):
+    """
+    Returns a shared genai.GenerativeModel for a model name, creating it on first use.
+
+    Generation settings should be passed per call to generate_content, so a single
+    model object can serve every caller.
+
+    Args:
+        model_name (str): The Gemini model to use.
+        api_key (str, optional): Defaults to the GEMINI_API_KEY environment variable.
+
+    Returns:
+        genai.GenerativeModel: The cached model object.
+    """
+    with _registry_lock:
+        _configure_gemini(api_key)
+        model = _gemini_models.get(model_name)
+        if model is None:
+            model = _import_genai().GenerativeModel(model_name)
+            _gemini_models[model_name] = model
+            logging.info(f"Created Gemini model object for '{model_name}'.")
+        return model
+
+
+# --- Provider Interface ---
+
+class Provider:
+    """
+    Base class for a model provider.
+
+    Subclasses implement generate() and either matches() (to claim model names
+    by pattern) or rely on the explicit '<provider name>:<model>' prefix.
+    """
+
+    name = None
+    # Requests kept in flight against this provider when the caller sets no concurrency.
+    default_concurrency = 8
+
+    def matches(self, model_name):
+        """Returns True if this provider serves the given (unprefixed) model name."""
+        return False
+
+    def setup(self):
+        """Checks local configuration (e.g. that an API key is set) without any network calls."""
+
+    def generate(self, model_name, prompt, json_mode=False, temperature=None, timeout=None):
+        """
+        Sends a single prompt to a model and returns the response text.
+
+        Args:
+            model_name (str): The provider's name for the model.
+            prompt (str): The complete prompt.
+            json_mode (bool): Ask the model to return a single JSON object.
+            temperature (float, optional): Sampling temperature; provider default if None.
+            timeout (float, optional): Seconds to wait for the response before raising a
+                timeout error (classified as retryable). No limit if None.
+
+        Returns:
+            str: The text content of the model's response.
+
+        Raises:
+            Exception: API errors are propagated so callers can retry or record them.
+        """
+        response_text, _ = self.generate_with_telemetry(model_name, prompt, json_mode=json_mode,
+                                                        temperature=temperature, timeout=timeout)
+        return response_text
+
+    def generate_with_telemetry(self, model_name, prompt, json_mode=False, temperature=None, timeout=None, stream=False):
+        """
+        Like generate(), but also returns telemetry about the call.
+
+        With stream=True the response is streamed, so time to first token can be
+        measured; the returned text is the same.
+
+        Returns:
+            tuple: (response text, telemetry dict built by make_telemetry)
+        """
+        raise NotImplementedError
+
+
+def make_telemetry(start, first_token_at=None, input_tokens=None, output_tokens=None,
+                   cached_tokens=None, finish_reason=None, stream=False):
+    """
+    Builds the telemetry record stored next to every response.
+
+    Args:
+        start (float): time.perf_counter() when the request was sent.
+        first_token_at (float, optional): time.perf_counter() when the first token arrived.
+
+    Returns:
+        dict: Latency in seconds, token counts (None if the provider did not report
+              them), output tokens per second and the finish reason.
+    """
+    latency = time.perf_counter() - start
+    return {
+        "stream": stream,
+        "ttft_s": round(first_token_at - start, 4) if first_token_at is not None else None,
+        "latency_s": round(latency, 4),
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "cached_tokens": cached_tokens,
+        "output_tokens_per_s": round(output_tokens / latency, 2) if output_tokens and latency > 0 else None,
+        "finish_reason": finish_reason,
+    }
+
+
+def summarize_telemetry(telemetry_records):
+    """
+    Aggregates the telemetry of a batch of calls (cache hits are counted, not averaged).
+
+    Returns:
+        dict: Call and cache-hit counts, mean latency and TTFT in seconds, total
+              input/output/cached tokens, the share of input tokens served from the
+              provider's prompt cache, and overall output tokens per second.
+    """
+    calls = [t for t in telemetry_records if t and not t.get('cache_hit')]
+
+    def mean_of(key):
+        values = [t[key] for t in calls if t.get(key) is not None]
+        return round(sum(values) / len(values), 3) if values else None
+
+    def total_of(key):
+        return sum(t.get(key) or 0 for t in calls)
+
+    total_latency = sum(t.get('latency_s') or 0 for t in calls)
+    return {
+        'calls': len(calls),
+        'cache_hits': len(telemetry_records) - len(calls),
+        'mean_latency_s': mean_of('latency_s'),
+        'mean_ttft_s': mean_of('ttft_s'),
+        'input_tokens': total_of('input_tokens'),
+        'output_tokens': total_of('output_tokens'),
+        'cached_tokens': total_of('cached_tokens'),
+        'cached_token_ratio': round(total_of('cached_tokens') / total_of('input_tokens'), 3) if total_of('input_tokens') else None,
+        'output_tokens_per_s': round(total_of('output_tokens') / total_latency, 2) if total_latency else None,
+    }
+
+
+class GeminiProvider(Provider):
+    """Google Gemini models via the google-generativeai SDK."""
+
+    name = 'gemini'
+
+    def matches(self, model_name):
+        return 'gemini' in model_name.lower()
+
+    def setup(self):
+        _import_genai()
+        _require_env("GEMINI_API_KEY")
+
+    def generate_with_telemetry(self, model_name, prompt, json_mode=False, temperature=None, timeout=None, stream=False):
+        config = {}
+        if json_mode:
+            config['response_mime_type'] = "application/json"
+        if temperature is not None:
+            config['temperature'] = temperature
+        generation_config = _import_genai().GenerationConfig(**config) if config else None
+        request_options = {"timeout": timeout} if timeout else None
+
+        start = time.perf_counter()
+        first_token_at = None
+        response = get_gemini_model(model_name).generate_content(prompt, generation_config=generation_config,
+                                                                 request_options=request_options, stream=stream)
+        if stream:
+            parts = []
+            for chunk in response:
+                if chunk.parts:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    parts.append(chunk.text)
+            response_text = "".join(parts)
+        else:
+            response_text = response.text
+
+        usage = getattr(response, 'usage_metadata', None)
+        finish_reason = None
+        if getattr(response, 'candidates', None):
+            reason = response.candidates[0].finish_reason
+            finish_reason = getattr(reason, 'name', str(reason))
+        telemetry = make_telemetry(
+            start, first_token_at,
+            input_tokens=getattr(usage, 'prompt_token_count', None),
+            output_tokens=getattr(usage, 'candidates_token_count', None),
+            cached_tokens=getattr(usage, 'cached_content_token_count', None),
+            finish_reason=finish_reason, stream=stream
+        )
+        return response_text, telemetry
+
+
+class OpenAIProvider(Provider):
+    """OpenAI chat models via the openai>=1.0.0 SDK."""
+
+    name = 'openai'
+
+    def matches(self, model_name):
+        return 'gpt' in model_name.lower()
+
+    def setup(self):
+        _import_openai()
+        _require_env("OPENAI_API_KEY")
+
+    def get_client(self):
+        return get_openai_client()
+
+    def generate_with_telemetry(self, model_name, prompt, json_mode=False, temperature=None, timeout=None, stream=False):
+        request = {
+            "model": model_name,
+            "messages": [{"role": "user", "content": prompt}],
+        }
+        if json_mode:
+            request["response_format"] = {"type": "json_object"}
+        if temperature is not None:
+            request["temperature"] = temperature
+        if timeout:
+            request["timeout"] = timeout
+        if stream:
+            request["stream"] = True
+            request["stream_options"] = {"include_usage": True}
+
+        start = time.perf_counter()
+        first_token_at = None
+        response = self.get_client().chat.completions.create(**request)
+        if stream:
+            parts = []
+            usage = None
+            finish_reason = None
+            for chunk in response:
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    parts.append(delta)
+                if chunk.choices[0].finish_reason:
+                    finish_reason = chunk.choices[0].finish_reason
+            response_text = "".join(parts)
+        else:
+            usage = response.usage
+            finish_reason = response.choices[0].finish_reason
+            response_text = response.choices[0].message.content
+
+        details = getattr(usage, 'prompt_tokens_details', None)
+        telemetry = make_telemetry(
+            start, first_token_at,
+            input_tokens=getattr(usage, 'prompt_tokens', None),
+            output_tokens=getattr(usage, 'completion_tokens', None),
+            cached_tokens=getattr(details, 'cached_tokens', None),
+            finish_reason=finish_reason, stream=stream
+        )
+        return response_text, telemetry
+
+
+class OpenAICompatibleProvider(OpenAIProvider):
+    """
+    Any server exposing the OpenAI chat completions API at a custom base URL,
+    such as a local llama.cpp or vLLM server. Models are selected with the
+    '<name>:<model>' prefix, e.g. 'local:llama-3-8b-instruct'.
+
+    These servers batch concurrent requests on the GPU (continuous batching), so
+    the suggested concurrency is much higher than for hosted APIs.
+    """
+
+    default_concurrency = 32
+
+    def __init__(self, name, base_url, api_key=None, default_concurrency=None):
+        self.name = name
+        self.base_url = base_url
+        # Local servers usually ignore the key, but the SDK requires one.
+        self.api_key = api_key or "not-needed"
+        if default_concurrency is not None:
+            self.default_concurrency = default_concurrency
+
+    def setup(self):
+        _import_openai()
+
+    def get_client(self):
+        return get_openai_client(api_key=self.api_key, base_url=self.base_url)
+
+
+# --- Offline Providers ---
+# Mock and replay providers let the whole pipeline (data generation, prompting,
+# judging) run and be benchmarked without network access or API spend.
+
+class MockProviderError(Exception):
+    """A simulated API error. status_code drives retry classification like a real SDK error."""
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class ReplayMatchError(Exception):
+    """Raised when a replayed prompt carries no task input to match a recording against."""
+    pass
+
+
+def _prompt_seed(*parts):
+    """Derives a stable integer seed from strings, independent of PYTHONHASHSEED."""
+    digest = hashlib.sha256("\x1f".join(str(p) for p in parts).encode('utf-8')).hexdigest()
+    return int(digest[:16], 16)
+
+def default_mock_response(prompt, json_mode=False):
+    """
+    Returns a canned response shaped for whichever pipeline stage sent the prompt:
+    synthetic spell or material descriptions for data generation, a scores/rationales
+    object for the judge, or a minimal valid spell script otherwise.
+    """
+    count_match = re.search(r"exactly (\d+)", prompt)
+    count = int(count_match.group(1)) if count_match else 1
+    if '"spells"' in prompt:
+        return json.dumps({"spells": [f"Mock spell {i}: a bolt of light that splits in two." for i in range(count)]})
+    if '"descriptions"' in prompt:
+        return json.dumps({"descriptions": [
+            {"material_name": f"mock_material_{i}", "behavior_description": f"Mock material {i} falls like sand."}
+            for i in range(count)
+        ]})
+    if "### OUTPUT SCHEMA ###" in prompt:
+        return json.dumps({"scores": {"correctness": 3}, "rationales": {"correctness": "Mock judgement."}})
+    return json.dumps({"friendlyName": "Mock Spell", "components": [{"componentType": "projectile", "radius": 10}]})
+
+
+class MockProvider(Provider):
+    """
+    A deterministic stand-in for a real API. Select it with 'mock:<any model name>'.
+
+    Latency, error rates and responses are configurable. Outcomes depend only on
+    the seed, the prompt and how many times that prompt has been sent, so runs are
+    repeatable regardless of thread scheduling.
+
+    Args:
+        name (str): Provider name used as the model prefix.
+        latency (float): Mean simulated latency in seconds.
+        latency_jitter (float): Latency varies uniformly within +/- this many seconds.
+        error_rate (float): Probability of a retryable server error (HTTP 500).
+        throttle_rate (float): Probability of a rate-limit error (HTTP 429).
+        fatal_error_rate (float): Probability of a non-retryable error (HTTP 400).
+        responses (callable | list | None): A function (prompt, json_mode) -> str, a list
+            of canned responses chosen by prompt hash, or None for default_mock_response.
+        seed (int): Seed for all simulated randomness.
+
+    Provider prompt caching is simulated too: the reported cached tokens cover the
+    longest previously seen prompt prefix, in blocks of PREFIX_CACHE_BLOCK characters.
+    """
+
+    default_concurrency = 64
+    PREFIX_CACHE_BLOCK = 1024
+
+    def __init__(self, name='mock', latency=0.0, latency_jitter=0.0, error_rate=0.0,
+                 throttle_rate=0.0, fatal_error_rate=0.0, responses=None, seed=0):
+        self.name = name
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.fatal_error_rate = fatal_error_rate
+        self.responses = responses
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.call_counts = {}
+        self.seen_prefixes = set()
+        self.stats = {'calls': 0, 'errors': 0}
+
+    def _cached_prefix_chars(self, prompt):
+        """Returns how much of the prompt a prefix cache would hold, and remembers its prefixes."""
+        prefix_hash = hashlib.sha256()
+        cached_chars = 0
+        with self.lock:
+            for end in range(self.PREFIX_CACHE_BLOCK, len(prompt) + 1, self.PREFIX_CACHE_BLOCK):
+                prefix_hash.update(prompt[end - self.PREFIX_CACHE_BLOCK:end].encode('utf-8'))
+                digest = prefix_hash.hexdigest()
+                if digest in self.seen_prefixes:
+                    cached_chars = end
+                else:
+                    self.seen_prefixes.add(digest)
+        return cached_chars
+
+    def generate_with_telemetry(self, model_name, prompt, json_mode=False, temperature=None, timeout=None, stream=False):
+        start = time.perf_counter()
+        with self.lock:
+            attempt = self.call_counts.get(prompt, 0)
+            self.call_counts[prompt] = attempt + 1
+            self.stats['calls'] += 1
+        rng = random.Random(_prompt_seed(self.seed, model_name, prompt, attempt))
+
+        delay = self.latency + rng.uniform(-self.latency_jitter, self.latency_jitter)
+        if timeout and delay > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"Simulated request timed out after {timeout}s.")
+        if delay > 0:
+            time.sleep(delay)
+
+        roll = rng.random()
+        for rate, status_code in ((self.throttle_rate, 429), (self.error_rate, 500), (self.fatal_error_rate, 400)):
+            if roll < rate:
+                with self.lock:
+                    self.stats['errors'] += 1
+                raise MockProviderError(f"Simulated HTTP {status_code} from mock provider.", status_code)
+            roll -= rate
+
+        if callable(self.responses):
+            response_text = self.responses(prompt, json_mode)
+        elif self.responses:
+            response_text = self.responses[_prompt_seed(prompt) % len(self.responses)]
+        else:
+            response_text = default_mock_response(prompt, json_mode)
+        # Simulated streams deliver the first token after a tenth of the latency.
+        first_token_at = start + max(delay, 0) * 0.1 if stream else None
+        telemetry = make_telemetry(start, first_token_at, input_tokens=estimate_tokens(prompt),
+                                   output_tokens=estimate_tokens(response_text),
+                                   cached_tokens=self._cached_prefix_chars(prompt) // 4,
+                                   finish_reason="stop", stream=stream)
+        return response_text, telemetry
+
+
+class ReplayProvider(Provider):
+    """
+    Serves previously recorded responses. Select it with 'replay:<any model name>'.
+
+    A prompt is matched to a recording by the task input it contains (both the
+    prompting and the judge prompt layouts embed the input verbatim). Prompts
+    whose input was never recorded get a deterministic pick from all recordings;
+    prompts with no input marker at all (e.g. data generation prompts) raise
+    ReplayMatchError, since no recording can be meant for them.
+
+    Args:
+        records (list[dict]): Dicts with at least 'input' and 'response' keys.
+        name (str): Provider name used as the model prefix.
+        latency (float): Simulated latency in seconds for every call.
+    """
+
+    default_concurrency = 64
+
+    # Markers that precede the task input in format_prompt and build_judge_prompt.
+    INPUT_PATTERNS = (
+        re.compile(r"### User input to fulfil\n(.*?)(?:\n\n###|\n?\Z)", re.DOTALL),
+        re.compile(r"\*\*Input:\*\*\n(.*?)\n\n\*\*Context:\*\*", re.DOTALL),
+    )
+
+    def __init__(self, records, name='replay', latency=0.0):
+        if not records:
+            raise ProviderConfigError("ReplayProvider needs at least one recorded response.")
+        self.name = name
+        self.latency = latency
+        self.records = records
+        self.by_input = {}
+        for record in records:
+            self.by_input.setdefault(str(record.get('input', '')).strip(), record['response'])
+        self.lock = threading.Lock()
+        self.stats = {'matched': 0, 'unmatched': 0}
+
+    @classmethod
+    def from_session_logs(cls, log_dir, **kwargs):
+        """Builds a replay provider from every .txt session log under log_dir (searched recursively)."""
+        from ingest_data import parse_custom_log_format
+        records = []
+        for root, _, files in os.walk(log_dir):
+            for filename in sorted(files):
+                if filename.endswith(".txt"):
+                    for section in parse_custom_log_format(os.path.join(root, filename)):
+                        if 'response' in section:
+                            records.append(section)
+        logging.info(f"Loaded {len(records)} recorded responses from '{log_dir}'.")
+        return cls(records, **kwargs)
+
+    @classmethod
+    def from_database(cls, db_file, judgements=False, **kwargs):
+        """
+        Builds a replay provider from the responses table.
+
+        Args:
+            db_file (str): Path to the SQLite database.
+            judgements (bool): If True, replay judge outputs (scores and rationales of
+                judged rows) instead of model responses.
+        """
+        from db_utils import create_connection
+        conn = create_connection(db_file)
+        if not conn:
+            raise ProviderConfigError(f"Could not open database '{db_file}' for replay.")
+        try:
+            if judgements:
+                rows = conn.execute(
+                    "SELECT input, judge_scores_json, judge_rationales_json FROM responses_full WHERE status = 'judged';"
+                ).fetchall()
+                records = []
+                for task_input, scores_json, rationales_json in rows:
+                    scores = json.loads(scores_json)
+                    scores.pop("programmatic_validation", None)
+                    records.append({"input": task_input, "response": json.dumps({"scores": scores, "rationales": json.loads(rationales_json)})})
+            else:
+                rows = conn.execute("SELECT input, model_response FROM responses_full;").fetchall()
+                records = [{"input": task_input, "response": response} for task_input, response in rows]
+        finally:
+            conn.close()
+        logging.info(f"Loaded {len(records)} recorded {'judgements' if judgements else 'responses'} from '{db_file}'.")
+        return cls(records, **kwargs)
+
+    def generate_with_telemetry(self, model_name, prompt, json_mode=False, temperature=None, timeout=None, stream=False):
+        start = time.perf_counter()
+        if self.latency > 0:
+            time.sleep(self.latency)
+        matches = [match for match in (pattern.search(prompt) for pattern in self.INPUT_PATTERNS) if match]
+        if not matches:
+            raise ReplayMatchError(f"No matching record: the prompt to '{model_name}' has no task input marker, "
+                                   f"so it cannot be replayed.")
+        response_text = None
+        for match in matches:
+            if match.group(1).strip() in self.by_input:
+                response_text = self.by_input[match.group(1).strip()]
+                break
+        with self.lock:
+            self.stats['matched' if response_text is not None else 'unmatched'] += 1
+        if response_text is None:
+            response_text = self.records[_prompt_seed(prompt) % len(self.records)]['response']
+        telemetry = make_telemetry(start, start if stream else None, input_tokens=estimate_tokens(prompt),
+                                   output_tokens=estimate_tokens(response_text), cached_tokens=0,
+                                   finish_reason="stop", stream=stream)
+        return response_text, telemetry
+
+
+# --- Provider Registry ---
+
+_providers = [GeminiProvider(), OpenAIProvider(), MockProvider()]
+
+def register_provider(provider):
+    """
+    Registers a provider. Providers registered later take precedence when
+    matching model names by pattern; a provider with the same name is replaced.
+    """
+    with _registry_lock:
+        _providers[:] = [p for p in _providers if p.name != provider.name]
+        _providers.insert(0, provider)
+    logging.info(f"Registered model provider '{provider.name}'.")
+
+def register_openai_compatible_endpoint(base_url, name='local', api_key=None, default_concurrency=None):
+    """Convenience wrapper that registers an OpenAICompatibleProvider and returns it."""
+    provider = OpenAICompatibleProvider(name, base_url, api_key=api_key, default_concurrency=default_concurrency)
+    register_provider(provider)
+    return provider
+
+def get_provider(model_name):
+    """
+    Resolves a model name to its provider.
+
+    An explicit '<provider name>:<model>' prefix selects a provider directly;
+    otherwise each registered provider is asked whether it matches the name.
+
+    Args:
+        model_name (str): e.g. 'gpt-4.1', 'gemini-2.5-flash', or 'local:llama-3-8b'.
+
+    Returns:
+        tuple: (Provider, the model name to send to that provider)
+
+    Raises:
+        ProviderConfigError: If no registered provider serves the model.
+    """
+    with _registry_lock:
+        providers = list(_providers)
+
+    prefix, sep, rest = model_name.partition(':')
+    if sep:
+        for provider in providers:
+            if provider.name == prefix:
+                return provider, rest
+    for provider in providers:
+        if provider.matches(model_name):
+            return provider, model_name
+    known = ", ".join(p.name for p in providers)
+    raise ProviderConfigError(f"No provider found for model '{model_name}'. Registered providers: {known}.")
@@ -0,0 +1,277 @@
+import os
+import time
+import random
+import logging
+import threading
+
+# Configure basic logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# --- Default Limits ---
+# Request-rate defaults per provider. Token limits depend on the account tier, so
+# none is set by default: a 429 halves the concurrency (AIMD) instead. Set your
+# tier's limits with the <PROVIDER>_REQUESTS_PER_MINUTE / <PROVIDER>_TOKENS_PER_MINUTE
+# environment variables (e.g. OPENAI_TOKENS_PER_MINUTE=450000), the CLI flags
+# --requests_per_minute / --tokens_per_minute, or configure_rate_limit().
+# A value of None means that dimension is not limited client-side.
+DEFAULT_RATE_LIMITS = {
+    'openai': {'requests_per_minute': 500, 'tokens_per_minute': None},
+    'gemini': {'requests_per_minute': 1000, 'tokens_per_minute': None},
+}
+
+# HTTP status codes that indicate a transient failure worth retrying.
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+# Status codes (and SDK exception names) that mean "slow down".
+THROTTLE_STATUS_CODES = {429}
+THROTTLE_ERROR_NAMES = ("RateLimit", "ResourceExhausted", "TooManyRequests")
+RETRYABLE_ERROR_NAMES = ("Timeout", "Connection", "ServiceUnavailable", "DeadlineExceeded",
+                         "InternalServer", "BadGateway", "GatewayTimeout")
+
+
+class RetriesExhaustedError(Exception):
+    """Raised when a retryable error persists after all retry attempts."""
+
+    def __init__(self, attempts, last_error):
+        super().__init__(f"Gave up after {attempts} attempts: {last_error}")
+        self.attempts = attempts
+        self.last_error = last_error
+
+
+# --- Error Classification ---
+
+def _get_status_code(exc):
+    """Extracts an HTTP status code from an OpenAI or Google API exception, if present."""
+    for attr in ('status_code', 'code'):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+def classify_error(exc):
+    """
+    Classifies an exception raised by a provider call.
+
+    Returns:
+        str: 'throttle' for rate-limit signals, 'retryable' for other transient
+             failures, or 'fatal' for errors that will not succeed on retry.
+    """
+    status_code = _get_status_code(exc)
+    error_name = type(exc).__name__
+
+    if status_code in THROTTLE_STATUS_CODES or any(name in error_name for name in THROTTLE_ERROR_NAMES):
+        return 'throttle'
+    if status_code in RETRYABLE_STATUS_CODES or any(name in error_name for name in RETRYABLE_ERROR_NAMES):
+        return 'retryable'
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return 'retryable'
+    return 'fatal'
+
+def _get_retry_after(exc):
+    """Reads a Retry-After header (in seconds) from the exception's HTTP response, if any."""
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+def estimate_tokens(text):
+    """Roughly estimates the token count of a string (about 4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+# --- Limiter Components ---
+
+class TokenBucket:
+    """A thread-safe token bucket that refills continuously at a per-minute rate."""
+
+    def __init__(self, rate_per_minute):
+        self.capacity = float(rate_per_minute)
+        self.tokens = float(rate_per_minute)
+        self.refill_per_second = rate_per_minute / 60.0
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        """Blocks until `amount` tokens are available, then consumes them."""
+        # A single request larger than the whole bucket is allowed once the bucket is full.
+        amount = min(float(amount), self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second)
+                self.updated_at = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait_seconds = (amount - self.tokens) / self.refill_per_second
+            time.sleep(wait_seconds)
+
+
+class RateLimiter:
+    """
+    Rate limits, retries and adapts the concurrency of calls to one provider/model.
+
+    Requests and tokens per minute are enforced with token buckets. The number of
+    calls allowed in flight follows AIMD: it grows by roughly one slot per window of
+    successful calls and halves whenever the provider signals throttling.
+    """
+
+    def __init__(self, name, requests_per_minute=None, tokens_per_minute=None,
+                 max_concurrency=8, min_concurrency=1, max_retries=6,
+                 base_delay=1.0, max_delay=60.0):
+        self.name = name
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self.concurrency_limit = float(max_concurrency)
+        self.in_flight = 0
+        self.condition = threading.Condition()
+
+        self.stats = {'calls': 0, 'successes': 0, 'throttled': 0, 'retried': 0, 'failed': 0}
+
+    def _acquire_slot(self):
+        with self.condition:
+            while self.in_flight >= max(self.min_concurrency, int(self.concurrency_limit)):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def _release_slot(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def _on_success(self):
+        with self.condition:
+            self.stats['successes'] += 1
+            # Additive increase: +1 slot after a full window of successes.
+            self.concurrency_limit = min(self.max_concurrency, self.concurrency_limit + 1.0 / self.concurrency_limit)
+            self.condition.notify_all()
+
+    def _on_throttle(self):
+        with self.condition:
+            self.stats['throttled'] += 1
+            # Multiplicative decrease.
+            self.concurrency_limit = max(self.min_concurrency, self.concurrency_limit / 2.0)
+            logging.warning(f"[{self.name}] Throttled by provider. Concurrency limit reduced to {int(self.concurrency_limit)}.")
+
+    def _backoff_delay(self, attempt, exc):
+        """Full-jitter exponential backoff, never shorter than a provider's Retry-After."""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        retry_after = _get_retry_after(exc)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    def call(self, func, *args, estimated_tokens=0, **kwargs):
+        """
+        Calls func(*args, **kwargs) under the rate limits, retrying transient failures.
+
+        Args:
+            func (callable): The provider call to make.
+            estimated_tokens (int): Tokens to reserve from the tokens-per-minute budget.
+
+        Returns:
+            The return value of func.
+
+        Raises:
+            RetriesExhaustedError: If a retryable error persists after max_retries retries.
+            Exception: Any fatal (non-retryable) error raised by func, unchanged.
+        """
+        attempt = 0
+        while True:
+            if self.request_bucket:
+                self.request_bucket.acquire(1)
+            if self.token_bucket and estimated_tokens:
+                self.token_bucket.acquire(estimated_tokens)
+
+            self._acquire_slot()
+            try:
+                with self.condition:
+                    self.stats['calls'] += 1
+                result = func(*args, **kwargs)
+            except Exception as e:
+                kind = classify_error(e)
+                if kind == 'fatal':
+                    with self.condition:
+                        self.stats['failed'] += 1
+                    raise
+                if kind == 'throttle':
+                    self._on_throttle()
+                if attempt >= self.max_retries:
+                    with self.condition:
+                        self.stats['failed'] += 1
+                    raise RetriesExhaustedError(attempt + 1, e) from e
+                delay = self._backoff_delay(attempt, e)
+                with self.condition:
+                    self.stats['retried'] += 1
+                logging.warning(f"[{self.name}] {kind} error ({e}). Retrying in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries}).")
+            else:
+                self._on_success()
+                return result
+            finally:
+                self._release_slot()
+
+            time.sleep(delay)
+            attempt += 1
+
+
+# --- Shared Registry ---
+
+def _limits_from_env(provider):
+    """Reads <PROVIDER>_REQUESTS_PER_MINUTE and <PROVIDER>_TOKENS_PER_MINUTE, if set."""
+    limits = {}
+    for setting in ('requests_per_minute', 'tokens_per_minute'):
+        value = os.getenv(f"{provider.upper()}_{setting.upper()}")
+        if value:
+            limits[setting] = float(value)
+    return limits
+
+_rate_limit_overrides = {}
+_limiters = {}
+_registry_lock = threading.Lock()
+
+def configure_rate_limit(provider, model_name=None, **limits):
+    """
+    Overrides the limits used for a provider, or for one model of a provider.
+    Must be called before the first get_rate_limiter() call for that model.
+    """
+    with _registry_lock:
+        _rate_limit_overrides[(provider, model_name)] = limits
+
+def get_rate_limiter(provider, model_name, max_concurrency=None):
+    """
+    Returns the shared RateLimiter for a provider/model pair, creating it on first use.
+    Its limits are DEFAULT_RATE_LIMITS, then the environment variables, then any
+    configure_rate_limit() overrides.
+
+    Args:
+        provider (str): The provider name, e.g. 'openai' or 'gemini'.
+        model_name (str): The model the limits apply to.
+        max_concurrency (int, optional): Upper bound on concurrent calls for this model.
+
+    Returns:
+        RateLimiter: The limiter shared by every caller using this model.
+    """
+    key = (provider, model_name)
+    with _registry_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            settings = dict(DEFAULT_RATE_LIMITS.get(provider, {}))
+            settings.update(_limits_from_env(provider))
+            settings.update(_rate_limit_overrides.get((provider, None), {}))
+            settings.update(_rate_limit_overrides.get(key, {}))
+            if max_concurrency is not None:
+                settings['max_concurrency'] = max_concurrency
+            limiter = RateLimiter(f"{provider}/{model_name}", **settings)
+            _limiters[key] = limiter
+        elif max_concurrency is not None and max_concurrency > limiter.max_concurrency:
+            limiter.max_concurrency = max_concurrency
+        return limiter
@@ -0,0 +1,118 @@
+import json
+import time
+import hashlib
+import sqlite3
+import logging
+import threading
+
+# Configure basic logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_MAX_CACHE_BYTES = 1024 * 1024 * 1024  # 1 GiB
+
+
+def make_cache_key(provider, model_name, params, full_prompt):
+    """
+    Builds a content-addressed cache key for a single model request.
+
+    Args:
+        provider (str): The provider name, e.g. 'openai' or 'gemini'.
+        model_name (str): The model the prompt is sent to.
+        params (dict): Any generation parameters that affect the output.
+        full_prompt (str): The complete prompt, as built by format_prompt.
+
+    Returns:
+        str: A SHA-256 hex digest identifying the request.
+    """
+    key_material = json.dumps([provider, model_name, params or {}, full_prompt], sort_keys=True)
+    return hashlib.sha256(key_material.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    A persistent, size-bounded LRU cache of model responses stored in SQLite.
+
+    Safe to share between threads. When the total size of the cached responses
+    exceeds max_bytes, the least recently used entries are evicted.
+    """
+
+    def __init__(self, cache_file, max_bytes=DEFAULT_MAX_CACHE_BYTES):
+        self.cache_file = cache_file
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+
+        self.conn = sqlite3.connect(cache_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL;")
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS response_cache (
+            cache_key TEXT PRIMARY KEY,
+            response TEXT NOT NULL,
+            size_bytes INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_access REAL NOT NULL
+        );
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_last_access ON response_cache (last_access);")
+        self.conn.commit()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM response_cache;").fetchone()[0]
+        logging.info(f"Opened response cache '{cache_file}' ({self.total_bytes} bytes cached).")
+
+    def get(self, cache_key):
+        """Returns the cached response for a key, or None on a miss."""
+        with self.lock:
+            row = self.conn.execute("SELECT response FROM response_cache WHERE cache_key = ?;", (cache_key,)).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            self.conn.execute("UPDATE response_cache SET last_access = ? WHERE cache_key = ?;", (time.time(), cache_key))
+            self.conn.commit()
+            self.stats['hits'] += 1
+            return row[0]
+
+    def put(self, cache_key, response):
+        """Stores a response, evicting least recently used entries if the cache is full."""
+        size_bytes = len(response.encode('utf-8'))
+        now = time.time()
+        with self.lock:
+            old = self.conn.execute("SELECT size_bytes FROM response_cache WHERE cache_key = ?;", (cache_key,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO response_cache (cache_key, response, size_bytes, created_at, last_access) VALUES (?, ?, ?, ?, ?);",
+                (cache_key, response, size_bytes, now, now)
+            )
+            self.total_bytes += size_bytes - (old[0] if old else 0)
+            self.stats['writes'] += 1
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        """Deletes least recently used entries until the cache fits in max_bytes. Caller holds the lock."""
+        while self.total_bytes > self.max_bytes:
+            rows = self.conn.execute(
+                "SELECT cache_key, size_bytes FROM response_cache ORDER BY last_access ASC LIMIT 100;"
+            ).fetchall()
+            if not rows:
+                break
+            for cache_key, size_bytes in rows:
+                if self.total_bytes <= self.max_bytes:
+                    break
+                self.conn.execute("DELETE FROM response_cache WHERE cache_key = ?;", (cache_key,))
+                self.total_bytes -= size_bytes
+                self.stats['evictions'] += 1
+
+    def get_or_call(self, cache_key, func, *args, **kwargs):
+        """
+        Read-through lookup: returns the cached response, or calls func(*args, **kwargs),
+        stores its result and returns it.
+        """
+        cached = self.get(cache_key)
+        if cached is not None:
+            return cached
+        response = func(*args, **kwargs)
+        self.put(cache_key, response)
+        return response
+
+    def close(self):
+        """Closes the underlying database connection."""
+        with self.lock:
+            self.conn.close()
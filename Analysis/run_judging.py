@@ -2,27 +2,31 @@ import os
 import re
 import json
 import sys
+import time
+import uuid
+import socket
 import sqlite3
 import logging
+import argparse
 from datetime import datetime
-import google.generativeai as genai
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 # Import utilities from our other scripts
 # Note: Ensure these files exist in the same directory.
-from db_utils import create_connection, get_status_breakdown
+from db_utils import create_connection, create_db_tables, get_status_breakdown, write_judge_scores
 from response_validation import validate_elemental_data, validate_spell_script, validate_ca_script
+from rate_limiting import get_rate_limiter, configure_rate_limit, estimate_tokens
+from providers import get_provider, register_provider, summarize_telemetry, ProviderConfigError, ReplayProvider
+from hedging import hedged_call, get_latency_histogram, DEFAULT_REQUEST_TIMEOUT
 
-# --- CONFIGURE GEMINI API ---
-# For security, the API key is read from an environment variable.
-# Ensure you have set `export GOOGLE_API_KEY="your_key_here"` in your terminal.
-try:
-    GOOGLE_API_KEY = os.environ["GEMINI_API_KEY"]
-    genai.configure(api_key=GOOGLE_API_KEY)
-    JUDGE_MODEL_NAME = "models/gemini-2.5-flash-preview-05-20" # Use the stable model identifier
-except KeyError:
-    print("FATAL ERROR: The 'GEMINI_API_KEY' environment variable is not set.")
-    print("Please set the variable and try again.")
-    sys.exit(1)
+# --- CONFIGURE JUDGE MODEL ---
+# The judge is resolved through the provider registry (see providers.py), so any
+# registered provider can act as judge. For security, API keys are read from
+# environment variables (GEMINI_API_KEY for the default judge) on first use, and
+# the client/model object is created once and reused for every record.
+# Set JUDGE_MODEL_NAME (e.g. 'mock:judge' or 'replay:judge') to judge offline.
+JUDGE_MODEL_NAME = os.getenv("JUDGE_MODEL_NAME", "models/gemini-2.5-flash-preview-05-20") # Use the stable model identifier
 
 
 # Configure basic logging
@@ -94,39 +98,118 @@ response::{"text": "model 2 response to task 1"}
     logging.info("Dummy prompt component files created.")
 
 
-def get_llm_judgement(prompt: str) -> str | None:
+def get_llm_judgement(prompt: str, judge_model_name: str = None,
+                      request_timeout: float = DEFAULT_REQUEST_TIMEOUT,
+                      hedge_percentile: float = None, telemetry_records: list = None) -> str:
     """
-    Calls the Gemini API to get a judgement for a given prompt.
+    Calls the judge model's API to get a judgement for a given prompt.
 
     Args:
         prompt: The fully constructed prompt for the LLM judge.
+        judge_model_name: The judge model to use; defaults to JUDGE_MODEL_NAME.
+        request_timeout: Seconds before a single request times out and is retried.
+        hedge_percentile: If set (e.g. 0.95), send a duplicate request once the first
+            exceeds that percentile of the judge's observed latency.
+        telemetry_records: If given, the call's telemetry (latency, token counts,
+            cached tokens) is appended to this list.
 
     Returns:
-        The text content of the LLM's response, or None if an error occurred.
+        The text content of the LLM's response.
+
+    Raises:
+        JudgementError: If the call fails; the message names the exception type
+            (e.g. 'ProviderTimeoutError: ...') so failures can be told apart later.
     """
-    logging.info("Sending request to Gemini API...")
+    judge_model_name = judge_model_name or JUDGE_MODEL_NAME
+    logging.info(f"Sending request to judge model '{judge_model_name}'...")
     try:
-        model = genai.GenerativeModel(JUDGE_MODEL_NAME)
-        # Enforce JSON output from the model for consistency
-        generation_config = genai.GenerationConfig(response_mime_type="application/json")
-        response = model.generate_content(prompt, generation_config=generation_config)
-        return response.text
+        provider, provider_model = get_provider(judge_model_name)
+        limiter = get_rate_limiter(provider.name, judge_model_name)
+        histogram = get_latency_histogram(judge_model_name)
+
+        def timed_generate():
+            # Enforce JSON output from the model for consistency.
+            response_text, telemetry = provider.generate_with_telemetry(provider_model, prompt, json_mode=True,
+                                                                        timeout=request_timeout)
+            histogram.record(telemetry['latency_s'])
+            return response_text, telemetry
+
+        # Throttled and transient failures are retried with backoff before giving up.
+        response_text, telemetry = hedged_call(limiter.call, timed_generate, estimated_tokens=estimate_tokens(prompt),
+                                               histogram=histogram, hedge_percentile=hedge_percentile)
+        if telemetry_records is not None:
+            telemetry_records.append(telemetry)
+        return response_text
     except Exception as e:
-        logging.error(f"An error occurred while calling the Gemini API: {e}")
-        return None
+        logging.error(f"An error occurred while calling the judge model API: {e}")
+        raise JudgementError(f"{type(e).__name__}: {e}") from e
+
+
+@lru_cache(maxsize=None)
+def _read_prompt_component(file_path):
+    """Reads a judge prompt component file once; they are constant for a run."""
+    with open(file_path, 'r') as f:
+        return f.read()
 
 
-def build_judge_prompt(rules_file, rubric_file, schema_file, task_input, task_context, task_response, validation_status):
+def _normalize_whitespace(text):
+    """Strips trailing spaces and collapses runs of blank lines to one."""
+    lines = [line.rstrip() for line in text.strip().splitlines()]
+    return re.sub(r'\n{3,}', '\n\n', '\n'.join(lines))
+
+
+def build_judge_prompt(rules_file, rubric_file, schema_file, task_input, task_context, task_response, validation_status,
+                       compact=False):
     """
     Builds a complete prompt for the LLM judge from modular components.
+
+    With compact=True, everything that is constant for a task type (instructions,
+    rules, rubric, schema) forms a whitespace-normalised prefix that is
+    byte-identical across records, so provider prompt caching applies. The
+    per-record validation status, input, context (as minified JSON) and response
+    all follow it.
     """
     try:
-        with open(rules_file, 'r') as f: rules = f.read()
-        with open(rubric_file, 'r') as f: rubric = f.read()
-        with open(schema_file, 'r') as f: schema = f.read()
+        rules = _read_prompt_component(rules_file)
+        rubric = _read_prompt_component(rubric_file)
+        schema = _read_prompt_component(schema_file)
     except FileNotFoundError as e:
         return f"Error: Could not find a prompt component file: {e}"
 
+    if compact:
+        try:
+            task_context = json.dumps(json.loads(task_context), separators=(',', ':'), ensure_ascii=False)
+        except (TypeError, json.JSONDecodeError):
+            pass  # Not JSON; pass it through unchanged.
+        constant_prefix = f"""You are an expert evaluator. Your task is to act as a judge and assess the quality of a response based on the provided context and input. Your output MUST be a single, valid JSON object and nothing else.
+
+### TASK RULES ###
+{_normalize_whitespace(rules)}
+
+### EVALUATION RUBRIC ###
+{_normalize_whitespace(rubric)}
+
+### OUTPUT SCHEMA ###
+{_normalize_whitespace(schema)}
+
+### ALGORITHMIC PRE-CHECK ###
+A programmatic check was run on the response to validate its basic structure and syntax. Its result is given with the task below. You should factor this pre-check into your final evaluation, especially for correctness scores."""
+        return f"""{constant_prefix}
+
+### TASK FOR EVALUATION ###
+**Syntactic Validation Status:** {validation_status}
+
+**Input:**
+{str(task_input).strip()}
+
+**Context:**
+{task_context}
+
+**Response to Evaluate:**
+{str(task_response).strip()}
+
+### YOUR EVALUATION (JSON ONLY) ###"""
+
     prompt = f"""
 You are an expert evaluator. Your task is to act as a judge and assess the quality of a response based on the provided context and input. Your output MUST be a single, valid JSON object and nothing else.
 
@@ -159,133 +242,423 @@ Syntactic Validation Status: {validation_status}
     return prompt.strip()
 
 
-def update_judged_record(conn, row_id, scores_json, rationales_json):
-    """Updates a record in the database with the judging results."""
+# --- Judge Work Queue ---
+# Rows are claimed by setting status 'in_progress' with the worker's ID and a
+# lease expiry, in a single UPDATE, so any number of judge processes (or machines
+# sharing the database file) can run side by side without judging a row twice.
+# A lease that expires (its worker crashed or hung) makes the row claimable again.
+# Every claim counts as an attempt. A failed attempt returns the row to 'pending'
+# with exponential backoff (next_attempt_at), so bad rows stop crowding the front
+# of the queue; after max_attempts the row is parked as 'failed' until requeued
+# with 'python db_utils.py requeue-failed'.
+
+# How long a claimed row stays reserved; longer than a batch normally takes.
+DEFAULT_LEASE_SECONDS = 600
+DEFAULT_MAX_ATTEMPTS = 5
+# The first retry waits this long, doubling per attempt up to MAX_RETRY_BACKOFF_SECONDS.
+DEFAULT_RETRY_BACKOFF_SECONDS = 60
+MAX_RETRY_BACKOFF_SECONDS = 3600
+
+def make_worker_id():
+    """Returns a worker ID unique to this process: host, PID and a random suffix."""
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+def claim_pending_records(conn, worker_id, limit, lease_seconds=DEFAULT_LEASE_SECONDS, task_type=None,
+                          max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Atomically claims up to `limit` pending rows that are due for an attempt (or
+    rows whose lease has expired) for worker_id, counting one attempt each, and
+    commits so other workers see the claim at once. Expired rows that have
+    already used max_attempts are marked 'failed' instead of being claimed again,
+    so a record that keeps killing its worker cannot loop forever.
+
+    Args:
+        conn (sqlite3.Connection): An active SQLite connection.
+        worker_id (str): The claiming worker, see make_worker_id.
+        limit (int): Maximum number of rows to claim.
+        lease_seconds (float): How long the rows stay reserved.
+        task_type (str): Only claim rows of this task type.
+        max_attempts (int): Attempts after which an expired row is marked 'failed'.
+
+    Returns:
+        list: The claimed rows, read from the 'responses_full' view.
+    """
+    now = time.time()
+    conn.commit()
+    conn.execute(
+        "UPDATE responses SET status = 'failed', worker_id = NULL, lease_expires_at = NULL, "
+        "last_error = 'Lease expired on the last attempt (the worker crashed or hung).' "
+        "WHERE status = 'in_progress' AND lease_expires_at < ? AND attempts >= ?;", (now, max_attempts)
+    )
+    # Written as IN (...) so both statuses are looked up in idx_status_task_type.
+    task_filter = "AND task_type = ?" if task_type else ""
+    sql = f"""
+    UPDATE responses
+    SET status = 'in_progress', worker_id = ?, lease_expires_at = ?, attempts = attempts + 1
+    WHERE row_id IN (
+        SELECT row_id FROM responses
+        WHERE status IN ('pending', 'in_progress') {task_filter}
+          AND ((status = 'pending' AND (next_attempt_at IS NULL OR next_attempt_at <= ?))
+               OR lease_expires_at < ?)
+        LIMIT ?
+    )
+    RETURNING row_id;
+    """
+    params = (worker_id, now + lease_seconds) + ((task_type,) if task_type else ()) + (now, now, limit)
+    row_ids = [row[0] for row in conn.execute(sql, params).fetchall()]
+    conn.commit()
+    if not row_ids:
+        return []
+    placeholders = ", ".join("?" * len(row_ids))
+    return conn.execute(f"SELECT * FROM responses_full WHERE row_id IN ({placeholders});", row_ids).fetchall()
+
+def release_worker_leases(conn, worker_id):
+    """
+    Returns the rows still claimed by worker_id to 'pending' (e.g. when a batch is
+    interrupted), so they can be claimed again right away.
+
+    Returns:
+        int: The number of rows released.
+    """
+    released = conn.execute(
+        "UPDATE responses SET status = 'pending', worker_id = NULL, lease_expires_at = NULL "
+        "WHERE status = 'in_progress' AND worker_id = ?;", (worker_id,)
+    ).rowcount
+    conn.commit()
+    return released
+
+def record_judge_failure(conn, record, worker_id, error, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                         retry_backoff=DEFAULT_RETRY_BACKOFF_SECONDS):
+    """
+    Records a failed judging attempt on a claimed row: the error goes to
+    last_error, and the row returns to 'pending' with an exponential backoff, or
+    becomes 'failed' once it has used max_attempts. The caller commits.
+
+    Args:
+        conn (sqlite3.Connection): An active SQLite connection.
+        record (sqlite3.Row): The claimed row (its 'attempts' includes this attempt).
+        worker_id (str): The worker holding the row's lease.
+        error (str): Why the attempt failed.
+        max_attempts (int): Attempts after which the row is marked 'failed'.
+        retry_backoff (float): Seconds before the first retry; doubles per attempt.
+
+    Returns:
+        str: The row's new status ('pending' or 'failed'), or None if the lease was lost.
+    """
+    attempts = record['attempts']
+    status = 'failed' if attempts >= max_attempts else 'pending'
+    delay = min(retry_backoff * 2 ** (attempts - 1), MAX_RETRY_BACKOFF_SECONDS)
+    updated = conn.execute(
+        "UPDATE responses SET status = ?, last_error = ?, next_attempt_at = ?, worker_id = NULL, lease_expires_at = NULL "
+        "WHERE row_id = ? AND status = 'in_progress' AND worker_id = ?;",
+        (status, str(error), time.time() + delay if status == 'pending' else None, record['row_id'], worker_id)
+    ).rowcount
+    return status if updated else None
+
+def update_judged_record(conn, row_id, scores_json, rationales_json, worker_id=None):
+    """
+    Updates a record in the database with the judging results. The scores are
+    also written one per row to the 'scores' table, and the programmatic
+    validation result to the indexed validation_status column.
+
+    With worker_id, the row is only updated if that worker still holds its lease;
+    if the lease expired and another worker claimed the row, this result is dropped.
+
+    Returns:
+        bool: True if the record was updated.
+    """
     sql = """
     UPDATE responses
     SET status = 'judged',
         judge_scores_json = ?,
-        judge_rationales_json = ?,
-        judged_at = ?
-    WHERE row_id = ?;
+        judge_rationales_json = compress(?),
+        judged_at = ?,
+        worker_id = NULL,
+        lease_expires_at = NULL,
+        next_attempt_at = NULL,
+        last_error = NULL
+    WHERE row_id = ?
     """
+    params = [scores_json, rationales_json, datetime.now().isoformat(), row_id]
+    if worker_id is not None:
+        sql += " AND status = 'in_progress' AND worker_id = ?"
+        params.append(worker_id)
     try:
         cursor = conn.cursor()
-        judged_at_timestamp = datetime.now().isoformat()
-        cursor.execute(sql, (scores_json, rationales_json, judged_at_timestamp, row_id))
+        cursor.execute(sql + ";", params)
+        if cursor.rowcount == 0:
+            logging.warning(f"Record {row_id} was not updated: its lease was lost to another worker.")
+            return False
+        write_judge_scores(conn, row_id, json.loads(scores_json))
         logging.info(f"Successfully updated record {row_id} with judging results.")
+        return True
     except sqlite3.Error as e:
         logging.error(f"Failed to update record {row_id}: {e}")
+        return False
+
+
+class JudgementError(Exception):
+    """Raised when a record cannot be judged in this attempt (the reason is the message)."""
+    pass
+
+
+def prepare_judge_prompt(record, prompt_folder, compact_prompts=False):
+    """
+    Runs the programmatic validator on a record and builds its judge prompt.
+    Validators print to stdout, which is silenced while they run, so this must
+    only be called from one thread at a time.
+
+    Returns:
+        tuple: (judge prompt, validation status)
+
+    Raises:
+        JudgementError: If the record's task type is unknown.
+    """
+    base_task_name = record['task_type']
+    if not base_task_name:
+        raise JudgementError(f"Could not extract base task name from '{record['task_key']}'.")
+
+    validation_status = "skipped"
+    validator_func = VALIDATION_MAP.get(base_task_name)
+    if validator_func:
+        original_stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+        try:
+            is_valid = validator_func(record['model_response'])
+            validation_status = "Passed" if is_valid else "Failed"
+        finally:
+            sys.stdout.close()
+            sys.stdout = original_stdout
+    else:
+        logging.info(f"No validator found for task type '{base_task_name}'.")
+
+    rules_path = os.path.join(prompt_folder, f"{base_task_name}_rules.txt")
+    rubric_path = os.path.join(prompt_folder, f"{base_task_name}_rubric.txt")
+    schema_path = os.path.join(prompt_folder, f"{base_task_name}_schema.txt")
+
+    judge_prompt = build_judge_prompt(
+        rules_file=rules_path, rubric_file=rubric_path, schema_file=schema_path,
+        task_input=record['input'], task_context=record['context'],
+        task_response=record['model_response'], validation_status=validation_status,
+        compact=compact_prompts
+    )
+    return judge_prompt, validation_status
+
+
+def parse_judgement(llm_response_text, validation_status):
+    """
+    Parses the judge's reply into the scores and rationales JSON stored in the DB.
+
+    Returns:
+        tuple: (scores JSON, rationales JSON)
+
+    Raises:
+        JudgementError: If the reply is missing, malformed, or lacks 'scores'/'rationales'.
+    """
+    if not llm_response_text:
+        raise JudgementError("Empty reply from the judge model.")
+
+    try:
+        judgement_data = json.loads(llm_response_text)
+    except json.JSONDecodeError:
+        logging.debug(f"Malformed response: {llm_response_text}")
+        raise JudgementError("Malformed JSON from LLM.")
+
+    # Extract the 'scores' and 'rationales' nested dictionaries.
+    scores_dict = judgement_data.get("scores") if isinstance(judgement_data, dict) else None
+    rationales_dict = judgement_data.get("rationales") if isinstance(judgement_data, dict) else None
 
+    # Validate the structure of the parsed data.
+    if not isinstance(scores_dict, dict) or not isinstance(rationales_dict, dict):
+        logging.debug(f"Received data: {judgement_data}")
+        raise JudgementError("Invalid JSON structure: 'scores' or 'rationales' key is missing or not a dictionary.")
 
-def process_unjudged_instances(db_file, prompt_folder, limit=5):
+    # Add the programmatic validation status to the scores, preserving existing logic.
+    scores_dict["programmatic_validation"] = validation_status
+
+    # Convert the separated dictionaries back into JSON strings for the database.
+    return json.dumps(scores_dict), json.dumps(rationales_dict)
+
+
+def process_unjudged_instances(db_file, prompt_folder, limit=5, judge_model_name=None,
+                               request_timeout=DEFAULT_REQUEST_TIMEOUT, hedge_percentile=None,
+                               compact_prompts=False, task_type=None, worker_id=None,
+                               lease_seconds=DEFAULT_LEASE_SECONDS, concurrency=1, claim_batch_size=None,
+                               commit_every=20, commit_interval=5.0, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                               retry_backoff=DEFAULT_RETRY_BACKOFF_SECONDS):
     """
-    Fetches pending records, runs validation, calls the LLM judge, and updates the DB.
+    Claims pending records, runs validation, calls the LLM judge, and updates the DB.
+    task_type restricts the batch to one task type, e.g. 'automataScripting'.
+    Records are claimed with a lease (see claim_pending_records), so several
+    judge processes can work through the same database; worker_id defaults to
+    make_worker_id(). Records left unjudged are released at the end of the batch.
+    judge_model_name overrides JUDGE_MODEL_NAME, e.g. 'mock:judge' for offline runs.
+    request_timeout and hedge_percentile are passed on to get_llm_judgement.
+    compact_prompts selects the prefix-cache-friendly layout of build_judge_prompt.
+
+    Up to `concurrency` judge calls run at once on a thread pool, bounded by the
+    judge model's shared rate limiter. Records are claimed claim_batch_size at a
+    time (default: twice the concurrency) as the pool drains, rather than all
+    up front, so leases stay short. Validation, prompt building and database
+    writes stay on the calling thread. Results are committed every commit_every
+    records or commit_interval seconds, so a crash keeps the work already done.
+
+    A record that cannot be judged (API failure, malformed or incomplete reply)
+    is retried by a later batch after a backoff of retry_backoff seconds,
+    doubling per attempt, and marked 'failed' after max_attempts (see
+    record_judge_failure); its last error is kept in last_error.
     """
+    judge_model_name = judge_model_name or JUDGE_MODEL_NAME
     logging.info(f"--- Starting Judging Process for up to {limit} records ---")
+    if concurrency < 1:
+        logging.error(f"Concurrency must be at least 1, got {concurrency}. Aborting.")
+        return
+    try:
+        provider = get_provider(judge_model_name)[0]
+        provider.setup()
+    except ProviderConfigError as e:
+        logging.error(f"Judge model '{judge_model_name}' is not configured: {e} Aborting.")
+        return
     conn = create_connection(db_file)
     if not conn:
         logging.error("Could not connect to database. Aborting.")
         return
+    # Adds the queue columns and rebuilds responses_full on databases made before them.
+    create_db_tables(conn)
 
     conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM responses WHERE status = 'pending' LIMIT ?;", (limit,))
-    pending_records = cursor.fetchall()
-
-    if not pending_records:
-        logging.info("No pending records to be judged. All done!")
-        conn.close()
-        return
-
-    logging.info(f"Found {len(pending_records)} records to process.")
-
-    for record in pending_records:
-        match = re.match(r'^[a-zA-Z0-9]+', record['task_key'])
-        if not match:
-            logging.warning(f"Could not extract base task name from '{record['task_key']}'. Skipping row_id {record['row_id']}.")
-            continue
-        base_task_name = match.group(0)
-
-        validation_status = "skipped"
-        validator_func = VALIDATION_MAP.get(base_task_name)
-        if validator_func:
-            original_stdout = sys.stdout
-            sys.stdout = open(os.devnull, 'w')
-            try:
-                is_valid = validator_func(record['model_response'])
-                validation_status = "Passed" if is_valid else "Failed"
-            finally:
-                sys.stdout.close()
-                sys.stdout = original_stdout
+    worker_id = worker_id or make_worker_id()
+    claim_batch_size = claim_batch_size or concurrency * 2
+    # Lets up to `concurrency` calls through at once (on top of the provider's own limits).
+    get_rate_limiter(provider.name, judge_model_name, max_concurrency=concurrency)
+    telemetry_records = []
+    counts = {'claimed': 0, 'judged': 0, 'retry': 0, 'failed': 0}
+    uncommitted = 0
+    last_commit = time.monotonic()
+
+    def skip(record, error):
+        nonlocal uncommitted
+        status = record_judge_failure(conn, record, worker_id, error, max_attempts=max_attempts,
+                                      retry_backoff=retry_backoff)
+        if status is None:
+            return
+        uncommitted += 1
+        counts['retry' if status == 'pending' else 'failed'] += 1
+        if status == 'failed':
+            logging.error(f"Giving up on row_id {record['row_id']} after {record['attempts']} attempts: {error}")
         else:
-            logging.info(f"No validator found for task type '{base_task_name}'.")
-
-        rules_path = os.path.join(prompt_folder, f"{base_task_name}_rules.txt")
-        rubric_path = os.path.join(prompt_folder, f"{base_task_name}_rubric.txt")
-        schema_path = os.path.join(prompt_folder, f"{base_task_name}_schema.txt")
+            logging.warning(f"Skipping row_id {record['row_id']} (attempt {record['attempts']}/{max_attempts}): {error}")
 
-        judge_prompt = build_judge_prompt(
-            rules_file=rules_path, rubric_file=rubric_path, schema_file=schema_path,
-            task_input=record['input'], task_context=record['context'],
-            task_response=record['model_response'], validation_status=validation_status
-        )
-
-        llm_response_text = get_llm_judgement(judge_prompt)
-
-        if not llm_response_text:
-            logging.warning(f"Skipping row_id {record['row_id']} due to an API call failure.")
-            continue
-
-        try:
-            judgement_data = json.loads(llm_response_text)
-        except json.JSONDecodeError:
-            logging.error(f"Skipping row_id {record['row_id']} due to malformed JSON from LLM.")
-            logging.debug(f"Malformed response: {llm_response_text}")
-            continue
-
-        # --- NEW PARSING LOGIC ---
-        # Extract the 'scores' and 'rationales' nested dictionaries.
-        scores_dict = judgement_data.get("scores")
-        rationales_dict = judgement_data.get("rationales")
-
-        # Validate the structure of the parsed data.
-        if not isinstance(scores_dict, dict) or not isinstance(rationales_dict, dict):
-            logging.error(f"Skipping row_id {record['row_id']} due to invalid JSON structure. 'scores' or 'rationales' key is missing or not a dictionary.")
-            logging.debug(f"Received data: {judgement_data}")
-            continue
-        # --- END NEW PARSING LOGIC ---
-
-        # Add the programmatic validation status to the scores, preserving existing logic.
-        scores_dict["programmatic_validation"] = validation_status
-
-        # Convert the separated dictionaries back into JSON strings for the database.
-        final_scores_json = json.dumps(scores_dict)
-        final_rationales_json = json.dumps(rationales_dict)
-
-        # Update the record in the database with the real results.
-        update_judged_record(conn, record['row_id'], final_scores_json, final_rationales_json)
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="judge") as executor:
+            in_flight = {}
+            exhausted = False
+            while True:
+                # 1. Keep the pool fed: claim another small batch once it runs low.
+                if not exhausted and len(in_flight) <= concurrency and counts['claimed'] < limit:
+                    records = claim_pending_records(conn, worker_id, min(claim_batch_size, limit - counts['claimed']),
+                                                    lease_seconds=lease_seconds, task_type=task_type,
+                                                    max_attempts=max_attempts)
+                    exhausted = not records
+                    counts['claimed'] += len(records)
+                    for record in records:
+                        try:
+                            judge_prompt, validation_status = prepare_judge_prompt(record, prompt_folder, compact_prompts)
+                        except JudgementError as e:
+                            skip(record, e)
+                            continue
+                        future = executor.submit(get_llm_judgement, judge_prompt, judge_model_name,
+                                                 request_timeout=request_timeout, hedge_percentile=hedge_percentile,
+                                                 telemetry_records=telemetry_records)
+                        in_flight[future] = (record, validation_status)
+                    if records:
+                        continue
+                if not in_flight:
+                    break
+
+                # 2. Store each judgement as it arrives.
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    record, validation_status = in_flight.pop(future)
+                    try:
+                        scores_json, rationales_json = parse_judgement(future.result(), validation_status)
+                    except JudgementError as e:
+                        skip(record, e)
+                        continue
+                    if update_judged_record(conn, record['row_id'], scores_json, rationales_json, worker_id=worker_id):
+                        counts['judged'] += 1
+                        uncommitted += 1
+
+                # 3. Commit periodically so finished work survives a crash.
+                if uncommitted >= commit_every or (uncommitted and time.monotonic() - last_commit >= commit_interval):
+                    conn.commit()
+                    uncommitted = 0
+                    last_commit = time.monotonic()
+        conn.commit()
+    finally:
+        released = release_worker_leases(conn, worker_id)
+        if released:
+            logging.info(f"Released {released} unjudged records back to 'pending'.")
+        conn.close()
 
-    conn.commit()
-    conn.close()
+    if counts['claimed'] == 0:
+        logging.info("No pending records to be judged. All done!")
+        return
+    logging.info(f"Worker '{worker_id}' judged {counts['judged']} of {counts['claimed']} claimed records "
+                 f"({counts['retry']} to be retried, {counts['failed']} marked failed).")
+    logging.info(f"Judge telemetry: {summarize_telemetry(telemetry_records)}")
     logging.info("--- Judging Process Finished for this Batch ---")
 
 
 if __name__ == '__main__':
-    DB_FILE = "judgements.db"
-    PROMPT_COMPONENT_FOLDER = "judge_prompts"
-
-    # NOTE: This step is for initial setup.
-    create_dummy_data_with_prompts(PROMPT_COMPONENT_FOLDER)
+    parser = argparse.ArgumentParser(description="Judge pending records. Several workers can run at once on the same database.")
+    parser.add_argument("--db_file", default="judgements.db", help="Path to the SQLite database.")
+    parser.add_argument("--prompt_folder", default="judge_prompts", help="Folder with the <task>_rules/_rubric/_schema.txt files.")
+    parser.add_argument("--limit", type=int, default=10, help="Number of records to claim and judge.")
+    parser.add_argument("--judge_model", default=None, help="Judge model (default: JUDGE_MODEL_NAME, or 'replay:judge' with --replay_db).")
+    parser.add_argument("--replay_db", default=None, help="Replay the judgements already stored in this SQLite database as the judge's answers.")
+    parser.add_argument("--task_type", default=None, help="Only judge this task type, e.g. 'automataScripting'.")
+    parser.add_argument("--worker_id", default=None, help="ID recorded on claimed rows (default: host-pid-random).")
+    parser.add_argument("--concurrency", type=int, default=1, help="Maximum number of judge calls in flight at once.")
+    parser.add_argument("--requests_per_minute", type=float, default=None, help="Your account's request limit for the judge model (default: the provider default).")
+    parser.add_argument("--tokens_per_minute", type=float, default=None, help="Your account's token limit for the judge model (default: none, 429s back off instead).")
+    parser.add_argument("--request_timeout", type=float, default=DEFAULT_REQUEST_TIMEOUT, help="Seconds before a single judge request times out and is retried.")
+    parser.add_argument("--hedge_percentile", type=float, default=None, help="Send a duplicate judge request once a request exceeds this latency percentile (e.g. 0.95).")
+    parser.add_argument("--compact_prompts", action="store_true", help="Use the prefix-cache-friendly judge prompt layout.")
+    parser.add_argument("--max_attempts", type=int, default=DEFAULT_MAX_ATTEMPTS, help="Attempts before a record is marked 'failed'.")
+    parser.add_argument("--lease_seconds", type=float, default=DEFAULT_LEASE_SECONDS, help="How long claimed records stay reserved.")
+    parser.add_argument("--create_dummy_data", action="store_true", help="First write the dummy logs and prompt components used for initial setup.")
+    args = parser.parse_args()
+
+    if args.create_dummy_data:
+        create_dummy_data_with_prompts(args.prompt_folder)
+    if args.replay_db:
+        try:
+            register_provider(ReplayProvider.from_database(args.replay_db, judgements=True))
+        except ProviderConfigError as e:
+            sys.exit(f"Cannot replay judgements: {e}")
+        args.judge_model = args.judge_model or "replay:judge"
+    rate_limits = {setting: getattr(args, setting) for setting in ('requests_per_minute', 'tokens_per_minute')
+                   if getattr(args, setting) is not None}
+    if rate_limits:
+        judge_model_name = args.judge_model or JUDGE_MODEL_NAME
+        try:
+            configure_rate_limit(get_provider(judge_model_name)[0].name, judge_model_name, **rate_limits)
+        except ProviderConfigError as e:
+            sys.exit(f"Judge model '{judge_model_name}' is not configured: {e}")
     print("\nReminder: This script assumes an ingestion process has populated the database.")
     print("If the database is empty, please run your ingestion script first.")
     
     # Run the judging process on the ingested data.
-    process_unjudged_instances(DB_FILE, PROMPT_COMPONENT_FOLDER, limit=10)
+    process_unjudged_instances(args.db_file, args.prompt_folder, limit=args.limit, judge_model_name=args.judge_model,
+                               task_type=args.task_type, worker_id=args.worker_id, lease_seconds=args.lease_seconds,
+                               concurrency=args.concurrency, max_attempts=args.max_attempts,
+                               request_timeout=args.request_timeout, hedge_percentile=args.hedge_percentile,
+                               compact_prompts=args.compact_prompts)
 
     # Show the final results
     print("\n--- Final Status Breakdown ---")
-    final_conn = create_connection(DB_FILE)
+    final_conn = create_connection(args.db_file)
     if final_conn:
         get_status_breakdown(final_conn)
-        final_conn.close()
\ No newline at end of file
+        final_conn.close()
@@ -0,0 +1,157 @@
+import zlib
+import logging
+
+# Configure basic logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Compressed values are stored as BLOBs starting with this marker, followed by a
+# one-byte codec tag. Uncompressed values stay TEXT, so a column can hold both.
+BLOB_MARKER = b"\x1bLSC"
+ZLIB_TAG = b"z"
+ZSTD_TAG = b"s"
+# Followed by the 4-byte big-endian id of the dictionary the value was compressed with.
+ZSTD_DICT_TAG = b"d"
+
+CODECS = ("none", "zlib", "zstd")
+DEFAULT_LEVELS = {"zlib": 6, "zstd": 9}
+# Values shorter than this (in UTF-8 bytes) are left as text; they rarely shrink.
+DEFAULT_MIN_BYTES = 256
+# Size of a trained zstd dictionary (zstd's own default).
+DEFAULT_DICTIONARY_SIZE = 112640
+
+# Columns holding large text, as (table, column).
+COMPRESSED_COLUMNS = (
+    ("responses", "model_response"),
+    ("responses", "context"),
+    ("responses", "judge_rationales_json"),
+    ("problems", "context"),
+)
+
+
+class CompressionConfigError(Exception):
+    """Raised when a codec is configured but cannot be used here."""
+    pass
+
+
+def _import_zstandard():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise CompressionConfigError("The 'zstandard' package is required for zstd compression.") from e
+    return zstandard
+
+
+def is_compressed(value):
+    """Returns True if a column value was written by TextCodec.compress."""
+    return isinstance(value, bytes) and value.startswith(BLOB_MARKER)
+
+
+class TextCodec:
+    """
+    Compresses and decompresses text column values.
+
+    compress() turns a str into a marked BLOB when that saves space, and leaves
+    it as text otherwise (short values, codec 'none'). decompress() accepts
+    anything read from a column: marked BLOBs are decoded whichever codec wrote
+    them, other values are returned unchanged. One codec belongs to one
+    connection; zstd compressors must not be shared between threads.
+    """
+
+    def __init__(self, codec="none", level=None, min_bytes=DEFAULT_MIN_BYTES, dictionaries=None, dictionary_id=None):
+        """
+        Args:
+            codec (str): One of CODECS, used for new values.
+            level (int): Compression level (default from DEFAULT_LEVELS).
+            min_bytes (int): Values shorter than this are not compressed.
+            dictionaries (dict): zstd dictionary id -> dictionary bytes, for decoding.
+            dictionary_id (int): The dictionary new zstd values are compressed with.
+        """
+        if codec not in CODECS:
+            raise CompressionConfigError(f"Unknown compression codec '{codec}'. Use one of: {', '.join(CODECS)}.")
+        self.codec = codec
+        self.level = level if level is not None else DEFAULT_LEVELS.get(codec)
+        self.min_bytes = min_bytes
+        self.dictionaries = dict(dictionaries or {})
+        self.dictionary_id = dictionary_id
+        self._zstd_compressor = None
+        self._zstd_decompressors = {}
+        if codec == "zstd":
+            zstandard = _import_zstandard()
+            if dictionary_id is not None:
+                if dictionary_id not in self.dictionaries:
+                    raise CompressionConfigError(f"zstd dictionary {dictionary_id} is not stored in this database.")
+                dict_data = zstandard.ZstdCompressionDict(self.dictionaries[dictionary_id])
+                self._zstd_compressor = zstandard.ZstdCompressor(level=self.level, dict_data=dict_data)
+            else:
+                self._zstd_compressor = zstandard.ZstdCompressor(level=self.level)
+
+    def compress(self, value):
+        """Returns the value to store for `value`: a marked BLOB, or the value itself."""
+        if not isinstance(value, str) or self.codec == "none":
+            return value
+        data = value.encode('utf-8')
+        if len(data) < self.min_bytes:
+            return value
+        if self.codec == "zlib":
+            blob = BLOB_MARKER + ZLIB_TAG + zlib.compress(data, self.level)
+        elif self.dictionary_id is not None:
+            blob = BLOB_MARKER + ZSTD_DICT_TAG + self.dictionary_id.to_bytes(4, 'big') + self._zstd_compressor.compress(data)
+        else:
+            blob = BLOB_MARKER + ZSTD_TAG + self._zstd_compressor.compress(data)
+        return blob if len(blob) < len(data) else value
+
+    def decompress(self, value):
+        """Returns the text stored in a column value (compressed or not)."""
+        if not is_compressed(value):
+            return value
+        tag = value[len(BLOB_MARKER):len(BLOB_MARKER) + 1]
+        payload = value[len(BLOB_MARKER) + 1:]
+        if tag == ZLIB_TAG:
+            return zlib.decompress(payload).decode('utf-8')
+        if tag == ZSTD_TAG:
+            return self._zstd_decompressor(None).decompress(payload).decode('utf-8')
+        if tag == ZSTD_DICT_TAG:
+            dictionary_id = int.from_bytes(payload[:4], 'big')
+            return self._zstd_decompressor(dictionary_id).decompress(payload[4:]).decode('utf-8')
+        raise CompressionConfigError(f"Unknown compression tag {tag!r}.")
+
+    def _zstd_decompressor(self, dictionary_id):
+        decompressor = self._zstd_decompressors.get(dictionary_id)
+        if decompressor is None:
+            zstandard = _import_zstandard()
+            if dictionary_id is None:
+                decompressor = zstandard.ZstdDecompressor()
+            elif dictionary_id in self.dictionaries:
+                decompressor = zstandard.ZstdDecompressor(dict_data=zstandard.ZstdCompressionDict(self.dictionaries[dictionary_id]))
+            else:
+                raise CompressionConfigError(f"zstd dictionary {dictionary_id} is not stored in this database.")
+            self._zstd_decompressors[dictionary_id] = decompressor
+        return decompressor
+
+
+def train_zstd_dictionary(samples, dict_size=DEFAULT_DICTIONARY_SIZE):
+    """
+    Trains a zstd dictionary on sample texts, e.g. our own model responses.
+    Small JSON documents share most of their structure, which a dictionary
+    captures once instead of in every compressed value.
+
+    Args:
+        samples (list[str]): Texts representative of the compressed columns.
+        dict_size (int): Maximum dictionary size in bytes.
+
+    Returns:
+        tuple: (dictionary id, dictionary bytes)
+    """
+    zstandard = _import_zstandard()
+    dictionary = zstandard.train_dictionary(dict_size, [sample.encode('utf-8') for sample in samples])
+    return dictionary.dict_id(), dictionary.as_bytes()
+
+
+if __name__ == '__main__':
+    # Demo: compress a typical automataScripting response with zlib.
+    demo_response = ('{"name": "acid", "color_hex": "#7FFF00", "behavior": {"actions": ['
+                     + ", ".join('{"type": "if_neighbor_is", "options": ["sand", "water"], "actions": [{"type": "do_swap", "direction": "south"}]}' for _ in range(8))
+                     + ']}}')
+    codec = TextCodec("zlib")
+    compressed = codec.compress(demo_response)
+    logging.info(f"zlib: {len(demo_response)} -> {len(compressed)} bytes, round trip ok: {codec.decompress(compressed) == demo_response}")